@@ -0,0 +1,107 @@
+"""Кэши функции api: сменный бэкенд (пока — память процесса) и кэш сессий поверх него"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+class CacheBackend:
+    """Интерфейс хранилища кэша; общий для инстансов бэкенд (Redis и т.п.) реализует те же методы"""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class MemoryBackend(CacheBackend):
+    """TTL + LRU в памяти процесса, не больше max_entries записей"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SessionCache:
+    """Пользователь по токену; ключ — sha256 токена, чтобы сам токен не лежал в кэше.
+    Сброс — версия session_ver:<id> в том же бэкенде; её снимают до чтения из БД, поэтому запись хранит id
+    пользователя дольше его данных, а первый поиск по токену только запоминает id"""
+
+    def __init__(self, backend, ttl=60, id_ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.id_ttl = max(id_ttl, ttl)
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def _key(token):
+        return 'session:' + hashlib.sha256(token.encode()).hexdigest()
+
+    def _version(self, user_id):
+        key = 'session_ver:' + user_id
+        version = self.backend.get(key)
+        if version is None:
+            version = os.urandom(8).hex()
+            self.backend.set(key, version, self.id_ttl)
+        return version
+
+    def get(self, token):
+        """(user, version): user — из кэша или None; version — передать в put после чтения из БД"""
+        item = self.backend.get(self._key(token))
+        if item is None:
+            self.stats['misses'] += 1
+            return None, None
+        user_id, stamp, user, fresh_until = item
+        version = self._version(user_id)
+        if user is None or stamp != version or fresh_until < time.time():
+            self.stats['misses'] += 1
+            return None, version
+        self.stats['hits'] += 1
+        return dict(user), version
+
+    def put(self, token, user, version):
+        if version is None:
+            self.backend.set(self._key(token), (user['id'], None, None, 0), self.id_ttl)
+        else:
+            self.backend.set(self._key(token), (user['id'], version, dict(user), time.time() + self.ttl), self.id_ttl)
+
+    def invalidate_user(self, user_id):
+        """Сбрасывает все закэшированные сессии пользователя — после изменения его полей"""
+        self.backend.set('session_ver:' + user_id, os.urandom(8).hex(), self.id_ttl)
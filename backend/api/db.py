@@ -0,0 +1,118 @@
+"""Пул соединений с Postgres, который переживает тёплые вызовы функции"""
+
+import os
+import time
+import threading
+import psycopg2
+import psycopg2.extensions
+import metrics
+
+class Connection(psycopg2.extensions.connection):
+    """Соединение пула; помнит, какие запросы на нём уже подготовлены"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.reset_prepared = False
+        self.committed = False
+
+    def commit(self):
+        self.committed = True
+        super().commit()
+
+    def lost_before_use(self):
+        """Соединение оборвалось, не открыв транзакцию и не пытаясь коммитить: запрос можно безопасно повторить"""
+        return bool(self.closed) and self.status == psycopg2.extensions.STATUS_READY and not self.committed
+
+class ConnectionPool:
+    """Ограниченный пул: проверка живости, переподключение, idle-таймаут и сброс транзакции при возврате"""
+
+    def __init__(self, connect, max_size=2, idle_timeout=300.0, ping_after=30.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self._idle = []
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'expired': 0}
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, released_at = self._idle.pop()
+            idle_for = time.monotonic() - released_at
+            if idle_for > self.idle_timeout:
+                self.stats['expired'] += 1
+                self._close(conn)
+                continue
+            if self._healthy(conn, idle_for):
+                self.stats['hits'] += 1
+                conn.committed = False
+                return conn
+            self.stats['reconnects'] += 1
+            self._close(conn)
+        self.stats['misses'] += 1
+        return self._connect()
+
+    def release(self, conn):
+        if conn.closed:
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.reset_prepared:
+                conn.cursor().execute('DEALLOCATE ALL')
+                conn.commit()
+                conn.prepared.clear()
+                conn.reset_prepared = False
+        except psycopg2.Error:
+            self._close(conn)
+            return
+        now = time.monotonic()
+        with self._lock:
+            expired = [c for c, ts in self._idle if now - ts > self.idle_timeout]
+            self._idle = [(c, ts) for c, ts in self._idle if now - ts <= self.idle_timeout]
+            keep = len(self._idle) < self.max_size
+            if keep:
+                self._idle.append((conn, now))
+        self.stats['expired'] += len(expired)
+        for c in expired:
+            self._close(c)
+        if not keep:
+            self._close(conn)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _healthy(self, conn, idle_for):
+        if conn.closed or conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if idle_for < self.ping_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+POOL = ConnectionPool(
+    lambda: psycopg2.connect(os.environ['DATABASE_URL'], connection_factory=Connection, cursor_factory=metrics.cursor_factory()),
+    max_size=int(os.environ.get('DB_POOL_SIZE', '2')),
+    idle_timeout=float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300')),
+    ping_after=float(os.environ.get('DB_POOL_PING_AFTER', '30')),
+)
@@ -1,25 +1,91 @@
 """API соцсети Online — авторизация, посты, комментарии, лайки, профили, верификация, уведомления"""
 
-import json
 import hashlib
-import uuid
 import os
 import base64
 import psycopg2
+from datetime import datetime
+from db import POOL
+from cache import MemoryBackend, SessionCache
+from queries import run
+from uploads import UploadError, store_image, AVATAR_SIZE, FEED_SIZE
+from router import ROUTES, Request, route
+from serialize import RowEncoder, array, dumps, extend
+import metrics
 
 CORS_HEADERS = {
     'Access-Control-Allow-Origin': '*',
     'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
     'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Authorization',
     'Access-Control-Max-Age': '86400',
-    'Content-Type': 'application/json'
+    'Content-Type': 'application/json; charset=utf-8'
 }
 
+SEARCH_CACHE = MemoryBackend(max_entries=int(os.environ.get('SEARCH_CACHE_SIZE', '512')))
+SEARCH_CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL', '30'))
+# Поиск ранжирует не больше стольких кандидатов на каждое поле и столько же отдаёт по всем страницам:
+# первая буква запроса не должна сортировать всю таблицу
+SEARCH_CANDIDATES = int(os.environ.get('SEARCH_CANDIDATES', '200'))
+
+REPLY_PREVIEW = 3
+
+POST_JSON = RowEncoder(('id', 'content', 'image_url', 'created_at', 'user_id', 'username', 'display_name', 'avatar_url', 'is_verified', 'likes_count', 'comments_count'))
+COMMENT_COLUMNS = ('id', 'content', 'created_at', 'parent_id', 'user_id', 'username', 'display_name', 'avatar_url', 'is_verified', 'reply_count')
+COMMENT_JSON = RowEncoder(COMMENT_COLUMNS)
+REPLY_JSON = RowEncoder(COMMENT_COLUMNS, replies=[], replies_cursor=None)
+NOTIFICATION_JSON = RowEncoder(('id', 'type', 'message', 'is_read', 'created_at', 'post_id', 'comment_id', 'from_username', 'from_display_name', 'from_avatar_url', 'from_is_verified', 'actors_count'))
+
+FEED_CACHE = MemoryBackend(max_entries=int(os.environ.get('FEED_CACHE_SIZE', '64')))
+FEED_CACHE_TTL = float(os.environ.get('FEED_CACHE_TTL', '5'))
+
+SESSION_CACHE = SessionCache(MemoryBackend(max_entries=int(os.environ.get('SESSION_CACHE_SIZE', '1024'))), ttl=float(os.environ.get('SESSION_CACHE_TTL', '60')))
+
 def get_db():
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    return POOL.acquire()
+
+def put_db(conn):
+    POOL.release(conn)
 
 def resp(status, body):
-    return {'statusCode': status, 'headers': CORS_HEADERS, 'body': json.dumps(body, default=str)}
+    return {'statusCode': status, 'headers': CORS_HEADERS, 'body': dumps(body)}
+
+def resp_raw(status, body_json):
+    """Ответ с уже сериализованным телом"""
+    return {'statusCode': status, 'headers': CORS_HEADERS, 'body': body_json}
+
+def encode_cursor(created_at, row_id):
+    raw = '%s|%s' % (created_at.isoformat(), row_id)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Разбирает курсор (created_at, id); None — если курсор битый"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def encode_rank_cursor(tier, score, row_id, shown):
+    raw = '%d|%r|%d|%s' % (tier, score, shown, row_id)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_rank_cursor(cursor):
+    """Разбирает курсор ранжированной выдачи (tier, score, id, сколько уже отдано); None — если курсор битый"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        tier, score, shown, row_id = raw.split('|', 3)
+        return int(tier), float(score), row_id, int(shown)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def like_escape(s):
+    return s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def new_id():
+    """Случайный UUID строкой; uuid (а с ним platform) импортируется при первой записи, а не на холодном старте"""
+    import uuid
+    return str(uuid.uuid4())
 
 def hash_pw(pw):
     return hashlib.sha256(pw.encode()).hexdigest()
@@ -28,331 +94,434 @@ def get_user_by_token(conn, token):
     if not token:
         return None
     token = token.replace('Bearer ', '')
-    cur = conn.cursor()
-    cur.execute("SELECT u.id, u.username, u.email, u.display_name, u.bio, u.avatar_url, u.is_private, u.is_verified, u.is_admin FROM users u JOIN sessions s ON s.user_id = u.id WHERE s.token = '%s' LIMIT 1" % token.replace("'", "''"))
-    row = cur.fetchone()
+    user, version = SESSION_CACHE.get(token)
+    if user:
+        return user
+    row = run(conn.cursor(), 'user_by_session', token).fetchone()
     if not row:
         return None
-    return {'id': row[0], 'username': row[1], 'email': row[2], 'display_name': row[3], 'bio': row[4], 'avatar_url': row[5], 'is_private': row[6], 'is_verified': row[7], 'is_admin': row[8]}
+    user = {'id': row[0], 'username': row[1], 'email': row[2], 'display_name': row[3], 'bio': row[4], 'avatar_url': row[5], 'is_private': row[6], 'is_verified': row[7], 'is_admin': row[8]}
+    SESSION_CACHE.put(token, user, version)
+    return user
 
-def handler(event, context):
-    """Единый API для соцсети Online"""
-    if event.get('httpMethod') == 'OPTIONS':
-        return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': ''}
+def load_liked(cur, post_ids, viewer_id):
+    """Множество постов страницы, которые лайкнул зритель — одним запросом"""
+    if not post_ids or not viewer_id:
+        return set()
+    return {r[0] for r in run(cur, 'liked_posts', viewer_id, list(post_ids)).fetchall()}
 
-    method = event.get('httpMethod', 'GET')
-    qs = event.get('queryStringParameters') or {}
-    path = qs.get('route', '/')
-    body = {}
-    if event.get('body'):
-        try:
-            raw = event['body']
-            if event.get('isBase64Encoded'):
-                raw = base64.b64decode(raw).decode()
-            body = json.loads(raw)
-        except:
-            body = {}
+# === AUTH ===
+
+@route('/auth/register', 'POST')
+def auth_register(req):
+    username = (req.body.get('username') or '').strip().lower()
+    email = (req.body.get('email') or '').strip().lower()
+    password = req.body.get('password') or ''
+    if not username or not email or not password:
+        return resp(400, {'error': 'Все поля обязательны'})
+    if len(username) < 3 or len(username) > 50:
+        return resp(400, {'error': 'Username от 3 до 50 символов'})
+    if len(password) < 6:
+        return resp(400, {'error': 'Пароль минимум 6 символов'})
+    if run(req.cur, 'user_exists', username, email).fetchone():
+        return resp(400, {'error': 'Пользователь уже существует'})
+    pw_hash = hash_pw(password)
+    user_id = new_id()
+    sess_token = new_id()
+    run(req.cur, 'user_insert', user_id, username, email, pw_hash, username)
+    run(req.cur, 'session_insert', user_id, sess_token)
+    req.conn.commit()
+    return resp(200, {'token': sess_token, 'user': {'id': user_id, 'username': username, 'display_name': username, 'is_verified': False, 'is_admin': False, 'avatar_url': '', 'bio': '', 'is_private': False}})
+
+@route('/auth/login', 'POST')
+def auth_login(req):
+    email = (req.body.get('email') or '').strip().lower()
+    password = req.body.get('password') or ''
+    if not email or not password:
+        return resp(400, {'error': 'Заполните все поля'})
+    pw_hash = hash_pw(password)
+    row = run(req.cur, 'user_login', email, pw_hash).fetchone()
+    if not row:
+        return resp(401, {'error': 'Неверный email или пароль'})
+    sess_token = new_id()
+    run(req.cur, 'session_insert', row[0], sess_token)
+    req.conn.commit()
+    return resp(200, {'token': sess_token, 'user': {'id': row[0], 'username': row[1], 'display_name': row[2], 'is_verified': row[3], 'is_admin': row[4], 'avatar_url': row[5], 'bio': row[6], 'is_private': row[7]}})
+
+@route('/auth/me', 'GET', auth=True)
+def auth_me(req):
+    return resp(200, {'user': req.user})
+
+# === POSTS ===
 
-    headers = event.get('headers') or {}
-    token = headers.get('X-Authorization') or headers.get('x-authorization') or headers.get('Authorization') or headers.get('authorization') or ''
+@route('/posts', 'GET')
+def posts_list(req):
+    limit = 20
+    cursor = req.qs.get('cursor')
+    cache_key = 'feed:%s' % (('c:' + cursor) if cursor else ('p:' + req.qs.get('page', '1')))
+    page = FEED_CACHE.get(cache_key)
+    if not page:
+        if cursor:
+            after = decode_cursor(cursor)
+            if not after:
+                return resp(400, {'error': 'Неверный курсор'})
+            rows = run(req.cur, 'feed_after', after[0], after[1], limit).fetchall()
+        else:
+            offset = (max(int(req.qs.get('page', '1')), 1) - 1) * limit
+            rows = run(req.cur, 'feed_first', limit, offset).fetchall()
+        # Кэшируются JSON-фрагменты постов без поля liked — его дописываем под зрителя
+        posts = [(r[0], POST_JSON.encode(r)) for r in rows]
+        tail = ',"next_cursor":%s}' % dumps(encode_cursor(rows[-1][3], rows[-1][0]) if len(rows) == limit else None)
+        page = {'posts': posts, 'tail': tail, 'body': '{"posts":%s%s' % (array([extend(p, '"liked":false') for _, p in posts]), tail)}
+        FEED_CACHE.set(cache_key, page, FEED_CACHE_TTL)
+    user = req.user
+    if not user:
+        return resp_raw(200, page['body'])
+    liked = load_liked(req.cur, [post_id for post_id, _ in page['posts']], user['id'])
+    posts = [extend(p, '"liked":true' if post_id in liked else '"liked":false') for post_id, p in page['posts']]
+    return resp_raw(200, '{"posts":%s%s' % (array(posts), page['tail']))
 
-    conn = get_db()
+@route('/posts', 'POST', auth=True)
+def posts_create(req):
+    user = req.user
+    content = (req.body.get('content') or '').strip()
+    image_url = req.body.get('image_url') or ''
+    if not content and not image_url:
+        return resp(400, {'error': 'Напишите что-нибудь'})
+    post_id = new_id()
+    run(req.cur, 'post_insert', post_id, user['id'], content, image_url)
+    run(req.cur, 'timeline_add_post', post_id)
+    req.conn.commit()
+    FEED_CACHE.clear()
+    return resp(200, {'id': post_id})
+
+# === LIKES ===
+
+@route('/likes', 'POST', auth=True)
+def likes_toggle(req):
+    user = req.user
+    post_id = req.body.get('post_id')
+    if not post_id:
+        return resp(400, {'error': 'post_id обязателен'})
+    existing = run(req.cur, 'like_lookup', post_id, user['id']).fetchone()
+    if existing and existing[1]:
+        run(req.cur, 'like_deactivate', existing[0])
+        cnt = run(req.cur, 'post_likes_decrement', post_id).fetchone()[0]
+        req.conn.commit()
+        return resp(200, {'liked': False, 'count': cnt})
+    if existing:
+        run(req.cur, 'like_activate', existing[0])
+        is_new = False
+    else:
+        like_id = new_id()
+        is_new = run(req.cur, 'like_insert', like_id, post_id, user['id']).fetchone() is not None
+        if not is_new:
+            cnt = run(req.cur, 'post_likes_count', post_id).fetchone()[0]
+            req.conn.commit()
+            return resp(200, {'liked': True, 'count': cnt})
+    cnt, post_owner = run(req.cur, 'post_likes_increment', post_id).fetchone()
+    if is_new and post_owner != user['id']:
+        n_id = new_id()
+        run(req.cur, 'notification_like_upsert', n_id, post_owner, user['id'], post_id, '%s лайкнул ваш пост' % user['display_name'])
+    req.conn.commit()
+    return resp(200, {'liked': True, 'count': cnt})
+
+# === COMMENTS ===
+
+@route('/comments', 'GET')
+def comments_list(req):
+    post_id = req.qs.get('post_id')
+    if not post_id:
+        return resp(400, {'error': 'post_id обязателен'})
+    limit = 20
+    cursor = req.qs.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            return resp(400, {'error': 'Неверный курсор'})
+        rows = run(req.cur, 'comments_top_after', post_id, after[0], after[1], limit).fetchall()
+    else:
+        rows = run(req.cur, 'comments_top_first', post_id, limit).fetchall()
+    previews = {}
+    with_replies = [r[0] for r in rows if r[9]]
+    if with_replies:
+        for r in run(req.cur, 'comments_replies_preview', post_id, with_replies, REPLY_PREVIEW).fetchall():
+            previews.setdefault(r[3], []).append(r)
+    comments = []
+    for r in rows:
+        replies = previews.get(r[0], [])
+        last = replies[-1] if replies else None
+        replies_cursor = encode_cursor(last[2], last[0]) if last and r[9] > len(replies) else None
+        comments.append(extend(COMMENT_JSON.encode(r), '"replies":%s,"replies_cursor":%s' % (REPLY_JSON.encode_many(replies), dumps(replies_cursor))))
+    next_cursor = encode_cursor(rows[-1][2], rows[-1][0]) if len(rows) == limit else None
+    body = '{"comments":%s,"next_cursor":%s' % (array(comments), dumps(next_cursor))
+    if not cursor:
+        total = run(req.cur, 'post_comments_count', post_id).fetchone()
+        body += ',"total":%d' % (total[0] if total else 0)
+    return resp_raw(200, body + '}')
+
+@route('/comments/thread', 'GET')
+def comments_thread(req):
+    comment_id = req.qs.get('comment_id')
+    if not comment_id:
+        return resp(400, {'error': 'comment_id обязателен'})
+    limit = 20
+    cursor = req.qs.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            return resp(400, {'error': 'Неверный курсор'})
+        rows = run(req.cur, 'comments_thread_after', comment_id, after[0], after[1], limit).fetchall()
+    else:
+        rows = run(req.cur, 'comments_thread_first', comment_id, limit).fetchall()
+    next_cursor = encode_cursor(rows[-1][2], rows[-1][0]) if len(rows) == limit else None
+    return resp_raw(200, '{"comments":%s,"next_cursor":%s}' % (REPLY_JSON.encode_many(rows), dumps(next_cursor)))
+
+@route('/comments', 'POST', auth=True)
+def comments_create(req):
+    user = req.user
+    post_id = req.body.get('post_id')
+    content = (req.body.get('content') or '').strip()
+    parent_id = req.body.get('parent_id')
+    if not post_id or not content:
+        return resp(400, {'error': 'Заполните все поля'})
+    c_id = new_id()
+    if parent_id and not run(req.cur, 'comment_replies_increment', parent_id, post_id).fetchone():
+        return resp(400, {'error': 'Комментарий не найден'})
+    run(req.cur, 'comment_insert', c_id, post_id, user['id'], content, parent_id or None)
+    post_owner = run(req.cur, 'post_comments_increment', post_id).fetchone()
+    if post_owner and post_owner[0] != user['id']:
+        n_id = new_id()
+        run(req.cur, 'notification_insert', n_id, post_owner[0], 'comment', user['id'], post_id, c_id, '%s прокомментировал ваш пост' % user['display_name'])
+    req.conn.commit()
+    return resp(200, {'id': c_id})
+
+# === PROFILE ===
+
+@route('/profile', 'GET')
+def profile_get(req):
+    username = req.qs.get('username')
+    if not username:
+        return resp(400, {'error': 'username обязателен'})
+    row = run(req.cur, 'profile_by_username', username).fetchone()
+    if not row:
+        return resp(404, {'error': 'Пользователь не найден'})
+    profile = {'id': row[0], 'username': row[1], 'display_name': row[2], 'bio': row[3], 'avatar_url': row[4], 'is_private': row[5], 'is_verified': row[6], 'is_admin': row[7], 'created_at': row[8]}
+    viewer = req.user
+    is_own = viewer and viewer['id'] == row[0]
+    if row[5] and not is_own:
+        return resp(200, {'profile': profile, 'posts': [], 'is_private_hidden': True})
+    prows = run(req.cur, 'profile_posts', row[0]).fetchall()
+    liked = load_liked(req.cur, [pr[0] for pr in prows], viewer['id'] if viewer else None)
+    posts = []
+    for pr in prows:
+        posts.append({'id': pr[0], 'content': pr[1], 'image_url': pr[2], 'created_at': pr[3], 'likes_count': pr[4], 'comments_count': pr[5], 'liked': pr[0] in liked, 'user_id': row[0], 'username': row[1], 'display_name': row[2], 'avatar_url': row[4], 'is_verified': row[6]})
+    profile['posts_count'] = run(req.cur, 'user_posts_count', row[0]).fetchone()[0]
+    return resp(200, {'profile': profile, 'posts': posts})
+
+@route('/profile/update', 'POST', auth=True)
+def profile_update(req):
+    user = req.user
+    display_name = req.body.get('display_name')
+    bio = req.body.get('bio')
+    is_private = req.body.get('is_private')
+    avatar_url = req.body.get('avatar_url')
+    if display_name is not None or bio is not None or is_private is not None or avatar_url is not None:
+        if is_private is not None:
+            was_private = run(req.cur, 'user_privacy_for_update', user['id']).fetchone()[0]
+            if bool(is_private) and not was_private:
+                run(req.cur, 'timeline_remove_user', user['id'])
+            elif not is_private and was_private:
+                run(req.cur, 'timeline_add_user', user['id'])
+        run(req.cur, 'profile_update', user['id'],
+            None if display_name is None else str(display_name),
+            None if bio is None else str(bio),
+            None if is_private is None else bool(is_private),
+            None if avatar_url is None else str(avatar_url))
+        req.conn.commit()
+        SESSION_CACHE.invalidate_user(user['id'])
+        FEED_CACHE.clear()
+    return resp(200, {'ok': True})
+
+# === SEARCH ===
+
+@route('/search', 'GET')
+def search_users(req):
+    q = (req.qs.get('q') or '').strip()
+    if not q:
+        return resp(200, {'users': [], 'next_cursor': None})
+    cursor = req.qs.get('cursor') or ''
+    cache_key = 'search:%s|%s' % (q.lower(), cursor)
+    cached = SEARCH_CACHE.get(cache_key)
+    if cached:
+        return resp(200, cached)
+    after, shown = (None, None, None), 0
+    if cursor:
+        decoded = decode_rank_cursor(cursor)
+        if not decoded:
+            return resp(400, {'error': 'Неверный курсор'})
+        after, shown = decoded[:3], decoded[3]
+    limit = max(0, min(20, SEARCH_CANDIDATES - shown))
+    if len(q) < 3:
+        rows = run(req.cur, 'user_search_prefix', like_escape(q) + '%', q, *after, limit, SEARCH_CANDIDATES).fetchall()
+    else:
+        rows = run(req.cur, 'user_search', '%' + like_escape(q) + '%', q, like_escape(q) + '%', *after, limit, SEARCH_CANDIDATES).fetchall()
+    users = [{'id': r[0], 'username': r[1], 'display_name': r[2], 'avatar_url': r[3], 'is_verified': r[4], 'is_admin': r[5]} for r in rows]
+    # Дальше SEARCH_CANDIDATES результатов выдача не листается — курсор заканчивается явно, а не пустой страницей
+    shown += len(rows)
+    next_cursor = encode_rank_cursor(rows[-1][6], rows[-1][7], rows[-1][0], shown) if rows and len(rows) == limit and shown < SEARCH_CANDIDATES else None
+    result = {'users': users, 'next_cursor': next_cursor}
+    SEARCH_CACHE.set(cache_key, result, SEARCH_CACHE_TTL)
+    return resp(200, result)
+
+# === VERIFICATION ===
+
+@route('/verification/request', 'POST', auth=True)
+def verification_request(req):
+    user = req.user
+    reason = (req.body.get('reason') or '').strip()
+    if not reason:
+        return resp(400, {'error': 'Укажите причину'})
+    if run(req.cur, 'verification_pending_for_user', user['id']).fetchone():
+        return resp(400, {'error': 'Заявка уже подана'})
+    vr_id = new_id()
+    run(req.cur, 'verification_insert', vr_id, user['id'], reason)
+    req.conn.commit()
+    return resp(200, {'id': vr_id})
+
+@route('/verification/list', 'GET', admin=True)
+def verification_list(req):
+    rows = run(req.cur, 'verification_list').fetchall()
+    reqs = [{'id': r[0], 'reason': r[1], 'status': r[2], 'created_at': r[3], 'user_id': r[4], 'username': r[5], 'display_name': r[6], 'avatar_url': r[7]} for r in rows]
+    return resp(200, {'requests': reqs})
+
+@route('/verification/review', 'POST', admin=True)
+def verification_review(req):
+    user = req.user
+    req_id = req.body.get('request_id')
+    action = req.body.get('action')
+    if not req_id or action not in ('approve', 'reject'):
+        return resp(400, {'error': 'Неверные параметры'})
+    row = run(req.cur, 'verification_pending_by_id', req_id).fetchone()
+    if not row:
+        return resp(404, {'error': 'Заявка не найдена'})
+    status = 'approved' if action == 'approve' else 'rejected'
+    run(req.cur, 'verification_review', req_id, status, user['id'])
+    if action == 'approve':
+        run(req.cur, 'user_set_verified', row[0])
+    n_id = new_id()
+    msg = 'Ваша заявка на верификацию одобрена!' if action == 'approve' else 'Ваша заявка на верификацию отклонена'
+    run(req.cur, 'notification_insert', n_id, row[0], 'verification', user['id'], None, None, msg)
+    req.conn.commit()
+    if action == 'approve':
+        SESSION_CACHE.invalidate_user(row[0])
+        FEED_CACHE.clear()
+    return resp(200, {'ok': True})
+
+# === NOTIFICATIONS ===
+
+@route('/notifications', 'GET', auth=True)
+def notifications_list(req):
+    user = req.user
+    limit = 50
+    cursor = req.qs.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor)
+        if not after:
+            return resp(400, {'error': 'Неверный курсор'})
+        rows = run(req.cur, 'notifications_after', user['id'], after[0], after[1], limit).fetchall()
+    else:
+        rows = run(req.cur, 'notifications_first', user['id'], limit).fetchall()
+    next_cursor = encode_cursor(rows[-1][4], rows[-1][0]) if len(rows) == limit else None
+    return resp_raw(200, '{"notifications":%s,"next_cursor":%s}' % (NOTIFICATION_JSON.encode_many(rows), dumps(next_cursor)))
+
+@route('/notifications/unread_count', 'GET', auth=True)
+def notifications_unread_count(req):
+    user = req.user
+    return resp(200, {'count': run(req.cur, 'notifications_unread_count', user['id']).fetchone()[0]})
+
+@route('/notifications/read', 'POST', auth=True)
+def notifications_read(req):
+    user = req.user
+    run(req.cur, 'notifications_read_all', user['id'])
+    req.conn.commit()
+    return resp(200, {'ok': True})
+
+# === UPLOADS ===
+
+@route('/upload/avatar', 'POST', auth=True)
+def upload_avatar(req):
+    user = req.user
+    image_data = req.body.get('image')
+    if not image_data:
+        return resp(400, {'error': 'Нет изображения'})
     try:
-        cur = conn.cursor()
-
-        # === AUTH ===
-        if path == '/auth/register' and method == 'POST':
-            username = (body.get('username') or '').strip().lower()
-            email = (body.get('email') or '').strip().lower()
-            password = body.get('password') or ''
-            if not username or not email or not password:
-                return resp(400, {'error': 'Все поля обязательны'})
-            if len(username) < 3 or len(username) > 50:
-                return resp(400, {'error': 'Username от 3 до 50 символов'})
-            if len(password) < 6:
-                return resp(400, {'error': 'Пароль минимум 6 символов'})
-            cur.execute("SELECT id FROM users WHERE username = '%s' OR email = '%s'" % (username.replace("'","''"), email.replace("'","''")))
-            if cur.fetchone():
-                return resp(400, {'error': 'Пользователь уже существует'})
-            pw_hash = hash_pw(password)
-            user_id = str(uuid.uuid4())
-            sess_token = str(uuid.uuid4())
-            cur.execute("INSERT INTO users (id, username, email, password_hash, display_name) VALUES ('%s','%s','%s','%s','%s')" % (user_id, username.replace("'","''"), email.replace("'","''"), pw_hash, username.replace("'","''")))
-            cur.execute("INSERT INTO sessions (user_id, token) VALUES ('%s','%s')" % (user_id, sess_token))
-            conn.commit()
-            return resp(200, {'token': sess_token, 'user': {'id': user_id, 'username': username, 'display_name': username, 'is_verified': False, 'is_admin': False, 'avatar_url': '', 'bio': '', 'is_private': False}})
-
-        if path == '/auth/login' and method == 'POST':
-            email = (body.get('email') or '').strip().lower()
-            password = body.get('password') or ''
-            if not email or not password:
-                return resp(400, {'error': 'Заполните все поля'})
-            pw_hash = hash_pw(password)
-            cur.execute("SELECT id, username, display_name, is_verified, is_admin, avatar_url, bio, is_private FROM users WHERE email = '%s' AND password_hash = '%s'" % (email.replace("'","''"), pw_hash))
-            row = cur.fetchone()
-            if not row:
-                return resp(401, {'error': 'Неверный email или пароль'})
-            sess_token = str(uuid.uuid4())
-            cur.execute("INSERT INTO sessions (user_id, token) VALUES ('%s','%s')" % (row[0], sess_token))
-            conn.commit()
-            return resp(200, {'token': sess_token, 'user': {'id': row[0], 'username': row[1], 'display_name': row[2], 'is_verified': row[3], 'is_admin': row[4], 'avatar_url': row[5], 'bio': row[6], 'is_private': row[7]}})
-
-        if path == '/auth/me' and method == 'GET':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            return resp(200, {'user': user})
-
-        # === POSTS ===
-        if path == '/posts' and method == 'GET':
-            page = int(qs.get('page', '1'))
-            limit = 20
-            offset = (page - 1) * limit
-            cur.execute("SELECT p.id, p.content, p.image_url, p.created_at, p.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, (SELECT COUNT(*) FROM likes WHERE post_id = p.id), (SELECT COUNT(*) FROM comments WHERE post_id = p.id) FROM posts p JOIN users u ON u.id = p.user_id WHERE u.is_private = false ORDER BY p.created_at DESC LIMIT %d OFFSET %d" % (limit, offset))
-            rows = cur.fetchall()
-            user = get_user_by_token(conn, token)
-            posts = []
-            for r in rows:
-                liked = False
-                if user:
-                    cur.execute("SELECT id FROM likes WHERE post_id = '%s' AND user_id = '%s'" % (r[0], user['id']))
-                    liked = cur.fetchone() is not None
-                posts.append({'id': r[0], 'content': r[1], 'image_url': r[2], 'created_at': r[3], 'user_id': r[4], 'username': r[5], 'display_name': r[6], 'avatar_url': r[7], 'is_verified': r[8], 'likes_count': r[9], 'comments_count': r[10], 'liked': liked})
-            return resp(200, {'posts': posts})
-
-        if path == '/posts' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            content = (body.get('content') or '').strip()
-            image_url = body.get('image_url') or ''
-            if not content and not image_url:
-                return resp(400, {'error': 'Напишите что-нибудь'})
-            post_id = str(uuid.uuid4())
-            cur.execute("INSERT INTO posts (id, user_id, content, image_url) VALUES ('%s','%s','%s','%s')" % (post_id, user['id'], content.replace("'","''"), image_url.replace("'","''")))
-            conn.commit()
-            return resp(200, {'id': post_id})
-
-        # === LIKES ===
-        if path == '/likes' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            post_id = body.get('post_id')
-            if not post_id:
-                return resp(400, {'error': 'post_id обязателен'})
-            cur.execute("SELECT id FROM likes WHERE post_id = '%s' AND user_id = '%s'" % (post_id.replace("'","''"), user['id']))
-            existing = cur.fetchone()
-            if existing:
-                cur.execute("UPDATE likes SET created_at = NULL WHERE id = '%s'" % existing[0])
-                cur.execute("SELECT COUNT(*) FROM likes WHERE post_id = '%s' AND created_at IS NOT NULL" % post_id.replace("'","''"))
-                cnt = cur.fetchone()[0]
-                conn.commit()
-                return resp(200, {'liked': False, 'count': cnt})
-            else:
-                like_id = str(uuid.uuid4())
-                cur.execute("INSERT INTO likes (id, post_id, user_id) VALUES ('%s','%s','%s')" % (like_id, post_id.replace("'","''"), user['id']))
-                cur.execute("SELECT user_id FROM posts WHERE id = '%s'" % post_id.replace("'","''"))
-                post_owner = cur.fetchone()
-                if post_owner and post_owner[0] != user['id']:
-                    n_id = str(uuid.uuid4())
-                    cur.execute("INSERT INTO notifications (id, user_id, type, from_user_id, post_id, message) VALUES ('%s','%s','like','%s','%s','%s')" % (n_id, post_owner[0], user['id'], post_id.replace("'","''"), '%s лайкнул ваш пост' % user['display_name'].replace("'","''")))
-                cur.execute("SELECT COUNT(*) FROM likes WHERE post_id = '%s' AND created_at IS NOT NULL" % post_id.replace("'","''"))
-                cnt = cur.fetchone()[0]
-                conn.commit()
-                return resp(200, {'liked': True, 'count': cnt})
-
-        # === COMMENTS ===
-        if path == '/comments' and method == 'GET':
-            post_id = qs.get('post_id')
-            if not post_id:
-                return resp(400, {'error': 'post_id обязателен'})
-            cur.execute("SELECT c.id, c.content, c.created_at, c.parent_id, c.user_id, u.username, u.display_name, u.avatar_url, u.is_verified FROM comments c JOIN users u ON u.id = c.user_id WHERE c.post_id = '%s' ORDER BY c.created_at ASC" % post_id.replace("'","''"))
-            rows = cur.fetchall()
-            comments = [{'id': r[0], 'content': r[1], 'created_at': r[2], 'parent_id': r[3], 'user_id': r[4], 'username': r[5], 'display_name': r[6], 'avatar_url': r[7], 'is_verified': r[8]} for r in rows]
-            return resp(200, {'comments': comments})
-
-        if path == '/comments' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            post_id = body.get('post_id')
-            content = (body.get('content') or '').strip()
-            parent_id = body.get('parent_id')
-            if not post_id or not content:
-                return resp(400, {'error': 'Заполните все поля'})
-            c_id = str(uuid.uuid4())
-            if parent_id:
-                cur.execute("INSERT INTO comments (id, post_id, user_id, content, parent_id) VALUES ('%s','%s','%s','%s','%s')" % (c_id, post_id.replace("'","''"), user['id'], content.replace("'","''"), parent_id.replace("'","''")))
-            else:
-                cur.execute("INSERT INTO comments (id, post_id, user_id, content) VALUES ('%s','%s','%s','%s')" % (c_id, post_id.replace("'","''"), user['id'], content.replace("'","''")))
-            cur.execute("SELECT user_id FROM posts WHERE id = '%s'" % post_id.replace("'","''"))
-            post_owner = cur.fetchone()
-            if post_owner and post_owner[0] != user['id']:
-                n_id = str(uuid.uuid4())
-                cur.execute("INSERT INTO notifications (id, user_id, type, from_user_id, post_id, comment_id, message) VALUES ('%s','%s','comment','%s','%s','%s','%s')" % (n_id, post_owner[0], user['id'], post_id.replace("'","''"), c_id, '%s прокомментировал ваш пост' % user['display_name'].replace("'","''")))
-            conn.commit()
-            return resp(200, {'id': c_id})
-
-        # === PROFILE ===
-        if path == '/profile' and method == 'GET':
-            username = qs.get('username')
-            if not username:
-                return resp(400, {'error': 'username обязателен'})
-            cur.execute("SELECT id, username, display_name, bio, avatar_url, is_private, is_verified, is_admin, created_at FROM users WHERE username = '%s'" % username.replace("'","''"))
-            row = cur.fetchone()
-            if not row:
-                return resp(404, {'error': 'Пользователь не найден'})
-            profile = {'id': row[0], 'username': row[1], 'display_name': row[2], 'bio': row[3], 'avatar_url': row[4], 'is_private': row[5], 'is_verified': row[6], 'is_admin': row[7], 'created_at': row[8]}
-            viewer = get_user_by_token(conn, token)
-            is_own = viewer and viewer['id'] == row[0]
-            if row[5] and not is_own:
-                return resp(200, {'profile': profile, 'posts': [], 'is_private_hidden': True})
-            cur.execute("SELECT p.id, p.content, p.image_url, p.created_at, (SELECT COUNT(*) FROM likes WHERE post_id = p.id), (SELECT COUNT(*) FROM comments WHERE post_id = p.id) FROM posts p WHERE p.user_id = '%s' ORDER BY p.created_at DESC LIMIT 50" % row[0])
-            posts = []
-            for pr in cur.fetchall():
-                liked = False
-                if viewer:
-                    cur.execute("SELECT id FROM likes WHERE post_id = '%s' AND user_id = '%s'" % (pr[0], viewer['id']))
-                    liked = cur.fetchone() is not None
-                posts.append({'id': pr[0], 'content': pr[1], 'image_url': pr[2], 'created_at': pr[3], 'likes_count': pr[4], 'comments_count': pr[5], 'liked': liked, 'user_id': row[0], 'username': row[1], 'display_name': row[2], 'avatar_url': row[4], 'is_verified': row[6]})
-            cur.execute("SELECT COUNT(*) FROM posts WHERE user_id = '%s'" % row[0])
-            profile['posts_count'] = cur.fetchone()[0]
-            return resp(200, {'profile': profile, 'posts': posts})
-
-        if path == '/profile/update' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            display_name = body.get('display_name')
-            bio = body.get('bio')
-            is_private = body.get('is_private')
-            avatar_url = body.get('avatar_url')
-            updates = []
-            if display_name is not None:
-                updates.append("display_name = '%s'" % str(display_name).replace("'","''"))
-            if bio is not None:
-                updates.append("bio = '%s'" % str(bio).replace("'","''"))
-            if is_private is not None:
-                updates.append("is_private = %s" % ('true' if is_private else 'false'))
-            if avatar_url is not None:
-                updates.append("avatar_url = '%s'" % str(avatar_url).replace("'","''"))
-            if updates:
-                cur.execute("UPDATE users SET %s WHERE id = '%s'" % (', '.join(updates), user['id']))
-                conn.commit()
-            return resp(200, {'ok': True})
-
-        # === SEARCH ===
-        if path == '/search' and method == 'GET':
-            q = (qs.get('q') or '').strip()
-            if not q:
-                return resp(200, {'users': []})
-            cur.execute("SELECT id, username, display_name, avatar_url, is_verified, is_admin FROM users WHERE username ILIKE '%%%s%%' OR display_name ILIKE '%%%s%%' LIMIT 20" % (q.replace("'","''"), q.replace("'","''")))
-            rows = cur.fetchall()
-            users = [{'id': r[0], 'username': r[1], 'display_name': r[2], 'avatar_url': r[3], 'is_verified': r[4], 'is_admin': r[5]} for r in rows]
-            return resp(200, {'users': users})
-
-        # === VERIFICATION ===
-        if path == '/verification/request' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            reason = (body.get('reason') or '').strip()
-            if not reason:
-                return resp(400, {'error': 'Укажите причину'})
-            cur.execute("SELECT id FROM verification_requests WHERE user_id = '%s' AND status = 'pending'" % user['id'])
-            if cur.fetchone():
-                return resp(400, {'error': 'Заявка уже подана'})
-            vr_id = str(uuid.uuid4())
-            cur.execute("INSERT INTO verification_requests (id, user_id, reason) VALUES ('%s','%s','%s')" % (vr_id, user['id'], reason.replace("'","''")))
-            conn.commit()
-            return resp(200, {'id': vr_id})
-
-        if path == '/verification/list' and method == 'GET':
-            user = get_user_by_token(conn, token)
-            if not user or not user.get('is_admin'):
-                return resp(403, {'error': 'Доступ запрещен'})
-            cur.execute("SELECT vr.id, vr.reason, vr.status, vr.created_at, u.id, u.username, u.display_name, u.avatar_url FROM verification_requests vr JOIN users u ON u.id = vr.user_id WHERE vr.status = 'pending' ORDER BY vr.created_at ASC")
-            rows = cur.fetchall()
-            reqs = [{'id': r[0], 'reason': r[1], 'status': r[2], 'created_at': r[3], 'user_id': r[4], 'username': r[5], 'display_name': r[6], 'avatar_url': r[7]} for r in rows]
-            return resp(200, {'requests': reqs})
-
-        if path == '/verification/review' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user or not user.get('is_admin'):
+        stored = store_image(image_data, 'avatars/%s' % user['id'], AVATAR_SIZE, square=True)
+    except UploadError as e:
+        return resp(e.status, {'error': e.message})
+    run(req.cur, 'user_set_avatar', user['id'], stored['url'])
+    req.conn.commit()
+    SESSION_CACHE.invalidate_user(user['id'])
+    FEED_CACHE.clear()
+    return resp(200, stored)
+
+@route('/upload/image', 'POST', auth=True)
+def upload_image(req):
+    image_data = req.body.get('image')
+    if not image_data:
+        return resp(400, {'error': 'Нет изображения'})
+    try:
+        stored = store_image(image_data, 'posts/%s' % new_id(), FEED_SIZE)
+    except UploadError as e:
+        return resp(e.status, {'error': e.message})
+    return resp(200, stored)
+
+# === METRICS ===
+
+@route('/metrics', 'GET', db=False)
+def metrics_report(req):
+    if not metrics.ENABLED:
+        return resp(404, {'error': 'Маршрут не найден'})
+    expected = os.environ.get('API_METRICS_TOKEN')
+    if expected and req.qs.get('token') != expected:
+        return resp(403, {'error': 'Доступ запрещен'})
+    return resp(200, {'routes': metrics.snapshot(), 'pool': POOL.stats, 'session_cache': SESSION_CACHE.stats})
+
+def dispatch(entry, req):
+    """Общий middleware: соединение из пула, проверка auth/admin, 500 на исключение, возврат соединения.
+    Если соединение из пула оказалось мёртвым (БД перезапускалась), запрос один раз повторяется на новом"""
+    if not entry.db:
+        return entry.fn(req)
+    for attempt in range(2):
+        req.conn = get_db()
+        try:
+            req.cur = req.conn.cursor()
+            if entry.admin and not (req.user and req.user.get('is_admin')):
                 return resp(403, {'error': 'Доступ запрещен'})
-            req_id = body.get('request_id')
-            action = body.get('action')
-            if not req_id or action not in ('approve', 'reject'):
-                return resp(400, {'error': 'Неверные параметры'})
-            cur.execute("SELECT user_id FROM verification_requests WHERE id = '%s' AND status = 'pending'" % req_id.replace("'","''"))
-            row = cur.fetchone()
-            if not row:
-                return resp(404, {'error': 'Заявка не найдена'})
-            status = 'approved' if action == 'approve' else 'rejected'
-            cur.execute("UPDATE verification_requests SET status = '%s', reviewed_by = '%s', reviewed_at = NOW() WHERE id = '%s'" % (status, user['id'], req_id.replace("'","''")))
-            if action == 'approve':
-                cur.execute("UPDATE users SET is_verified = true WHERE id = '%s'" % row[0])
-            n_id = str(uuid.uuid4())
-            msg = 'Ваша заявка на верификацию одобрена!' if action == 'approve' else 'Ваша заявка на верификацию отклонена'
-            cur.execute("INSERT INTO notifications (id, user_id, type, from_user_id, message) VALUES ('%s','%s','verification','%s','%s')" % (n_id, row[0], user['id'], msg))
-            conn.commit()
-            return resp(200, {'ok': True})
-
-        # === NOTIFICATIONS ===
-        if path == '/notifications' and method == 'GET':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            cur.execute("SELECT n.id, n.type, n.message, n.is_read, n.created_at, n.post_id, n.comment_id, COALESCE(u.username,''), COALESCE(u.display_name,''), COALESCE(u.avatar_url,''), COALESCE(u.is_verified, false) FROM notifications n LEFT JOIN users u ON u.id = n.from_user_id WHERE n.user_id = '%s' ORDER BY n.created_at DESC LIMIT 50" % user['id'])
-            rows = cur.fetchall()
-            notifs = [{'id': r[0], 'type': r[1], 'message': r[2], 'is_read': r[3], 'created_at': r[4], 'post_id': r[5], 'comment_id': r[6], 'from_username': r[7], 'from_display_name': r[8], 'from_avatar_url': r[9], 'from_is_verified': r[10]} for r in rows]
-            return resp(200, {'notifications': notifs})
-
-        if path == '/notifications/read' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user:
+            if entry.auth and not req.user:
                 return resp(401, {'error': 'Не авторизован'})
-            cur.execute("UPDATE notifications SET is_read = true WHERE user_id = '%s'" % user['id'])
-            conn.commit()
-            return resp(200, {'ok': True})
+            return entry.fn(req)
+        except psycopg2.OperationalError as e:
+            if attempt or not req.conn.lost_before_use():
+                return resp(500, {'error': str(e)})
+            POOL.clear()
+        except Exception as e:
+            return resp(500, {'error': str(e)})
+        finally:
+            put_db(req.conn)
 
-        if path == '/upload/avatar' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            import boto3
-            image_data = body.get('image')
-            if not image_data:
-                return resp(400, {'error': 'Нет изображения'})
-            img_bytes = base64.b64decode(image_data.split(',')[-1] if ',' in image_data else image_data)
-            key = 'avatars/%s.jpg' % user['id']
-            s3 = boto3.client('s3', endpoint_url='https://bucket.poehali.dev', aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'], aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'])
-            s3.put_object(Bucket='files', Key=key, Body=img_bytes, ContentType='image/jpeg')
-            cdn_url = 'https://cdn.poehali.dev/projects/%s/bucket/%s' % (os.environ['AWS_ACCESS_KEY_ID'], key)
-            cur.execute("UPDATE users SET avatar_url = '%s' WHERE id = '%s'" % (cdn_url.replace("'","''"), user['id']))
-            conn.commit()
-            return resp(200, {'url': cdn_url})
-
-        if path == '/upload/image' and method == 'POST':
-            user = get_user_by_token(conn, token)
-            if not user:
-                return resp(401, {'error': 'Не авторизован'})
-            import boto3
-            image_data = body.get('image')
-            if not image_data:
-                return resp(400, {'error': 'Нет изображения'})
-            img_bytes = base64.b64decode(image_data.split(',')[-1] if ',' in image_data else image_data)
-            fname = str(uuid.uuid4())
-            key = 'posts/%s.jpg' % fname
-            s3 = boto3.client('s3', endpoint_url='https://bucket.poehali.dev', aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'], aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'])
-            s3.put_object(Bucket='files', Key=key, Body=img_bytes, ContentType='image/jpeg')
-            cdn_url = 'https://cdn.poehali.dev/projects/%s/bucket/%s' % (os.environ['AWS_ACCESS_KEY_ID'], key)
-            return resp(200, {'url': cdn_url})
+def handler(event, context):
+    """Единый API для соцсети Online"""
+    if event.get('httpMethod') == 'OPTIONS':
+        return {'statusCode': 200, 'headers': CORS_HEADERS, 'body': ''}
 
+    req = Request(event, get_user_by_token)
+    entry = ROUTES.get((req.path, req.method))
+    if not entry:
         return resp(404, {'error': 'Маршрут не найден'})
-    except Exception as e:
-        conn.rollback()
-        return resp(500, {'error': str(e)})
-    finally:
-        conn.close()
\ No newline at end of file
+    if not metrics.ENABLED:
+        return dispatch(entry, req)
+    metrics.start()
+    result = dispatch(entry, req)
+    metrics.finish(req.method, req.path, result)
+    return result
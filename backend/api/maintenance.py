@@ -0,0 +1,91 @@
+"""Обслуживание БД соцсети Online — сверка денормализованных счётчиков и пересборка ленты
+
+    DATABASE_URL=... python maintenance.py reconcile            # только отчёт о расхождениях
+    DATABASE_URL=... python maintenance.py reconcile --repair   # отчёт и исправление
+    DATABASE_URL=... python maintenance.py rebuild-timeline     # пересобрать home_timeline с нуля
+"""
+
+import os
+import sys
+import argparse
+import psycopg2
+
+DRIFT_SQL = """
+SELECT p.id, p.likes_count, COALESCE(l.cnt, 0), p.comments_count, COALESCE(c.cnt, 0)
+FROM posts p
+LEFT JOIN (SELECT post_id, COUNT(*) AS cnt FROM likes WHERE created_at IS NOT NULL GROUP BY post_id) l ON l.post_id = p.id
+LEFT JOIN (SELECT post_id, COUNT(*) AS cnt FROM comments GROUP BY post_id) c ON c.post_id = p.id
+WHERE p.likes_count <> COALESCE(l.cnt, 0) OR p.comments_count <> COALESCE(c.cnt, 0)
+"""
+
+REPLIES_DRIFT_SQL = """
+SELECT c.id, c.replies_count, COALESCE(r.cnt, 0)
+FROM comments c
+LEFT JOIN (SELECT parent_id, COUNT(*) AS cnt FROM comments WHERE parent_id IS NOT NULL GROUP BY parent_id) r ON r.parent_id = c.id
+WHERE c.replies_count <> COALESCE(r.cnt, 0)
+"""
+
+def reconcile_counters(conn, repair=False):
+    """Находит посты, у которых likes_count/comments_count разошлись с likes/comments; при repair — исправляет"""
+    cur = conn.cursor()
+    cur.execute(DRIFT_SQL)
+    drift = [{'post_id': r[0], 'likes_count': r[1], 'likes_actual': r[2], 'comments_count': r[3], 'comments_actual': r[4]} for r in cur.fetchall()]
+    if repair and drift:
+        # Сначала блокируем строки, потом пересчитываем отдельным запросом: в READ COMMITTED у него свежий снимок,
+        # и инкремент, закоммиченный после DRIFT_SQL, не затрётся старым числом
+        ids = [d['post_id'] for d in drift]
+        cur.execute("SELECT id FROM posts WHERE id = ANY(%s) ORDER BY id FOR UPDATE", (ids,))
+        cur.execute("UPDATE posts p SET likes_count = (SELECT COUNT(*) FROM likes WHERE post_id = p.id AND created_at IS NOT NULL), comments_count = (SELECT COUNT(*) FROM comments WHERE post_id = p.id) WHERE p.id = ANY(%s)", (ids,))
+        conn.commit()
+    return drift
+
+def reconcile_reply_counters(conn, repair=False):
+    """То же для comments.replies_count, с той же блокировкой перед пересчётом"""
+    cur = conn.cursor()
+    cur.execute(REPLIES_DRIFT_SQL)
+    drift = [{'comment_id': r[0], 'replies_count': r[1], 'replies_actual': r[2]} for r in cur.fetchall()]
+    if repair and drift:
+        ids = [d['comment_id'] for d in drift]
+        cur.execute("SELECT id FROM comments WHERE id = ANY(%s) ORDER BY id FOR UPDATE", (ids,))
+        cur.execute("UPDATE comments c SET replies_count = (SELECT COUNT(*) FROM comments r WHERE r.parent_id = c.id) WHERE c.id = ANY(%s)", (ids,))
+        conn.commit()
+    return drift
+
+def rebuild_timeline(conn):
+    """Пересобирает home_timeline из posts и users в одной транзакции; возвращает число записей"""
+    cur = conn.cursor()
+    cur.execute("LOCK TABLE home_timeline IN EXCLUSIVE MODE")
+    cur.execute("DELETE FROM home_timeline")
+    cur.execute("INSERT INTO home_timeline (post_id, user_id, created_at) SELECT p.id, p.user_id, COALESCE(p.created_at, NOW()) FROM posts p JOIN users u ON u.id = p.user_id WHERE u.is_private = false")
+    count = cur.rowcount
+    conn.commit()
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Обслуживание БД соцсети Online')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('reconcile', help='сверить счётчики лайков и комментариев')
+    rec.add_argument('--repair', action='store_true', help='исправить найденные расхождения')
+    sub.add_parser('rebuild-timeline', help='пересобрать ленту home_timeline с нуля')
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        if args.command == 'reconcile':
+            drift = reconcile_counters(conn, repair=args.repair)
+            for d in drift:
+                print('%(post_id)s likes %(likes_count)s -> %(likes_actual)s, comments %(comments_count)s -> %(comments_actual)s' % d)
+            reply_drift = reconcile_reply_counters(conn, repair=args.repair)
+            for d in reply_drift:
+                print('comment %(comment_id)s replies %(replies_count)s -> %(replies_actual)s' % d)
+            drift += reply_drift
+            print('Расхождений: %d%s' % (len(drift), ', исправлено' if args.repair and drift else ''))
+            return 1 if drift and not args.repair else 0
+        if args.command == 'rebuild-timeline':
+            print('Записей в ленте: %d' % rebuild_timeline(conn))
+            return 0
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
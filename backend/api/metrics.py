@@ -0,0 +1,88 @@
+"""Метрики API по маршрутам: время ответа, время в БД, число SQL-запросов, размер ответа
+
+Включаются переменной API_METRICS=1; API_METRICS_LOG=1 дополнительно пишет JSON-строку на каждый запрос.
+Выключенные метрики не подменяют курсор и не трогают часы.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+import psycopg2.extensions
+
+ENABLED = os.environ.get('API_METRICS', '').lower() in ('1', 'true', 'yes')
+LOG = ENABLED and os.environ.get('API_METRICS_LOG', '').lower() in ('1', 'true', 'yes')
+RECENT = 512
+
+_local = threading.local()
+_lock = threading.Lock()
+_routes = {}
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Курсор, который засчитывает каждый execute() текущему запросу"""
+
+    def execute(self, query, vars=None):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            stats = getattr(_local, 'stats', None)
+            if stats is not None:
+                stats['db_ms'] += (time.perf_counter() - t0) * 1000
+                stats['statements'] += 1
+
+def cursor_factory():
+    return TimedCursor if ENABLED else None
+
+def start():
+    _local.stats = {'db_ms': 0.0, 'statements': 0, 'started': time.perf_counter()}
+
+def finish(method, path, result):
+    stats = _local.stats
+    _local.stats = None
+    wall_ms = (time.perf_counter() - stats['started']) * 1000
+    size = len((result.get('body') or '').encode())
+    status = result.get('statusCode', 0)
+    key = '%s %s' % (method, path)
+    with _lock:
+        agg = _routes.get(key)
+        if agg is None:
+            agg = _routes[key] = {'count': 0, 'errors': 0, 'wall_ms': 0.0, 'wall_ms_max': 0.0, 'db_ms': 0.0, 'statements': 0, 'bytes': 0, 'recent': deque(maxlen=RECENT)}
+        agg['count'] += 1
+        agg['errors'] += status >= 500
+        agg['wall_ms'] += wall_ms
+        agg['wall_ms_max'] = max(agg['wall_ms_max'], wall_ms)
+        agg['db_ms'] += stats['db_ms']
+        agg['statements'] += stats['statements']
+        agg['bytes'] += size
+        agg['recent'].append(wall_ms)
+    if LOG:
+        print(json.dumps({'metric': 'api_request', 'route': path, 'method': method, 'status': status, 'wall_ms': round(wall_ms, 3), 'db_ms': round(stats['db_ms'], 3), 'statements': stats['statements'], 'bytes': size}))
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))] if ordered else 0.0
+
+def snapshot():
+    """Агрегаты по маршрутам с начала жизни инстанса; перцентили — по последним RECENT запросам"""
+    with _lock:
+        items = [(key, dict(agg, recent=sorted(agg['recent']))) for key, agg in _routes.items()]
+    routes = {}
+    for key, agg in sorted(items):
+        n = agg['count']
+        routes[key] = {
+            'count': n,
+            'errors': agg['errors'],
+            'wall_ms_avg': round(agg['wall_ms'] / n, 3),
+            'wall_ms_p50': round(_percentile(agg['recent'], 50), 3),
+            'wall_ms_p99': round(_percentile(agg['recent'], 99), 3),
+            'wall_ms_max': round(agg['wall_ms_max'], 3),
+            'db_ms_avg': round(agg['db_ms'] / n, 3),
+            'statements_avg': round(agg['statements'] / float(n), 2),
+            'bytes_avg': agg['bytes'] // n,
+        }
+    return routes
+
+def reset():
+    with _lock:
+        _routes.clear()
@@ -0,0 +1,104 @@
+"""Именованные параметризованные запросы API; на каждом соединении пула готовятся один раз (PREPARE)"""
+
+import psycopg2
+
+INVALID_STATEMENT_NAME = '26000'
+
+STATEMENTS = {
+    # === AUTH ===
+    'user_by_session': "SELECT u.id, u.username, u.email, u.display_name, u.bio, u.avatar_url, u.is_private, u.is_verified, u.is_admin FROM users u JOIN sessions s ON s.user_id = u.id WHERE s.token = $1 LIMIT 1",
+    'user_exists': "SELECT id FROM users WHERE username = $1 OR email = $2",
+    'user_insert': "INSERT INTO users (id, username, email, password_hash, display_name) VALUES ($1, $2, $3, $4, $5)",
+    'session_insert': "INSERT INTO sessions (user_id, token) VALUES ($1, $2)",
+    'user_login': "SELECT id, username, display_name, is_verified, is_admin, avatar_url, bio, is_private FROM users WHERE email = $1 AND password_hash = $2",
+
+    # === POSTS ===
+    # Лента читается из home_timeline диапазоном по индексу; posts и users — только поиском по PK
+    'feed_first': "SELECT t.post_id, p.content, p.image_url, t.created_at, t.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, p.likes_count, p.comments_count FROM home_timeline t JOIN posts p ON p.id = t.post_id JOIN users u ON u.id = t.user_id ORDER BY t.created_at DESC, t.post_id DESC LIMIT $1 OFFSET $2",
+    'feed_after': "SELECT t.post_id, p.content, p.image_url, t.created_at, t.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, p.likes_count, p.comments_count FROM home_timeline t JOIN posts p ON p.id = t.post_id JOIN users u ON u.id = t.user_id WHERE (t.created_at, t.post_id) < ($1::timestamp, $2::text) ORDER BY t.created_at DESC, t.post_id DESC LIMIT $3",
+    'liked_posts': "SELECT post_id FROM likes WHERE user_id = $1 AND post_id = ANY($2::text[]) AND created_at IS NOT NULL",
+    'post_insert': "INSERT INTO posts (id, user_id, content, image_url) VALUES ($1, $2, $3, $4)",
+    'timeline_add_post': "INSERT INTO home_timeline (post_id, user_id, created_at) SELECT p.id, p.user_id, p.created_at FROM posts p JOIN users u ON u.id = p.user_id WHERE p.id = $1 AND u.is_private = false FOR SHARE OF u",
+    'timeline_add_user': "INSERT INTO home_timeline (post_id, user_id, created_at) SELECT id, user_id, COALESCE(created_at, NOW()) FROM posts WHERE user_id = $1 ON CONFLICT (post_id) DO NOTHING",
+    'timeline_remove_user': "DELETE FROM home_timeline WHERE user_id = $1",
+
+    # === LIKES ===
+    'like_lookup': "SELECT id, created_at IS NOT NULL FROM likes WHERE post_id = $1 AND user_id = $2 FOR UPDATE",
+    'like_insert': "INSERT INTO likes (id, post_id, user_id) VALUES ($1, $2, $3) ON CONFLICT (post_id, user_id) DO NOTHING RETURNING id",
+    'like_activate': "UPDATE likes SET created_at = NOW() WHERE id = $1",
+    'like_deactivate': "UPDATE likes SET created_at = NULL WHERE id = $1",
+    'post_likes_increment': "UPDATE posts SET likes_count = likes_count + 1 WHERE id = $1 RETURNING likes_count, user_id",
+    'post_likes_decrement': "UPDATE posts SET likes_count = GREATEST(likes_count - 1, 0) WHERE id = $1 RETURNING likes_count",
+    'post_likes_count': "SELECT likes_count FROM posts WHERE id = $1",
+
+    # === COMMENTS ===
+    # Ветки читаются по индексу (post_id, parent_id, created_at, id) страницами, а не целиком
+    'comments_top_first': "SELECT c.id, c.content, c.created_at, c.parent_id, c.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, c.replies_count FROM comments c JOIN users u ON u.id = c.user_id WHERE c.post_id = $1 AND c.parent_id IS NULL ORDER BY c.created_at, c.id LIMIT $2",
+    'comments_top_after': "SELECT c.id, c.content, c.created_at, c.parent_id, c.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, c.replies_count FROM comments c JOIN users u ON u.id = c.user_id WHERE c.post_id = $1 AND c.parent_id IS NULL AND (c.created_at, c.id) > ($2::timestamp, $3::text) ORDER BY c.created_at, c.id LIMIT $4",
+    'comments_replies_preview': "SELECT r.* FROM unnest($2::text[]) AS t(parent_id) CROSS JOIN LATERAL (SELECT c.id, c.content, c.created_at, c.parent_id, c.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, c.replies_count FROM comments c JOIN users u ON u.id = c.user_id WHERE c.post_id = $1 AND c.parent_id = t.parent_id ORDER BY c.created_at, c.id LIMIT $3) r ORDER BY r.created_at, r.id",
+    'comments_thread_first': "SELECT c.id, c.content, c.created_at, c.parent_id, c.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, c.replies_count FROM comments c JOIN users u ON u.id = c.user_id WHERE c.post_id = (SELECT post_id FROM comments WHERE id = $1) AND c.parent_id = $1 ORDER BY c.created_at, c.id LIMIT $2",
+    'comments_thread_after': "SELECT c.id, c.content, c.created_at, c.parent_id, c.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, c.replies_count FROM comments c JOIN users u ON u.id = c.user_id WHERE c.post_id = (SELECT post_id FROM comments WHERE id = $1) AND c.parent_id = $1 AND (c.created_at, c.id) > ($2::timestamp, $3::text) ORDER BY c.created_at, c.id LIMIT $4",
+    'post_comments_count': "SELECT comments_count FROM posts WHERE id = $1",
+    'comment_insert': "INSERT INTO comments (id, post_id, user_id, content, parent_id) VALUES ($1, $2, $3, $4, $5)",
+    'comment_replies_increment': "UPDATE comments SET replies_count = replies_count + 1 WHERE id = $1 AND post_id = $2 RETURNING id",
+    'post_comments_increment': "UPDATE posts SET comments_count = comments_count + 1 WHERE id = $1 RETURNING user_id",
+
+    # === PROFILE ===
+    'profile_by_username': "SELECT id, username, display_name, bio, avatar_url, is_private, is_verified, is_admin, created_at FROM users WHERE username = $1",
+    'profile_posts': "SELECT p.id, p.content, p.image_url, p.created_at, p.likes_count, p.comments_count FROM posts p WHERE p.user_id = $1 ORDER BY p.created_at DESC LIMIT 50",
+    'user_posts_count': "SELECT COUNT(*) FROM posts WHERE user_id = $1",
+    'user_privacy_for_update': "SELECT is_private FROM users WHERE id = $1 FOR UPDATE",
+    'profile_update': "UPDATE users SET display_name = COALESCE($2, display_name), bio = COALESCE($3, bio), is_private = COALESCE($4, is_private), avatar_url = COALESCE($5, avatar_url) WHERE id = $1",
+    'user_set_avatar': "UPDATE users SET avatar_url = $2 WHERE id = $1",
+
+    # === SEARCH ===
+    # $1 — шаблон поиска, $2 — сам запрос, $3 — шаблон префикса, $4..$6 — курсор (tier, score, id), $7 — лимит, $8 — кандидатов на ветку
+    # Ранжируются не все совпадения, а кандидаты: ближайшие по триграммам (KNN-обход GiST-индексов) и, чтобы длинные
+    # имена с префиксом запроса не вытеснялись короткими, первые совпадения по префиксу из text_pattern_ops-индексов
+    'user_search': "SELECT id, username, display_name, avatar_url, is_verified, is_admin, tier, score FROM (SELECT id, username, display_name, avatar_url, is_verified, is_admin, CASE WHEN lower(username) = lower($2) OR lower(display_name) = lower($2) THEN 0 WHEN username ILIKE $3 OR display_name ILIKE $3 THEN 1 ELSE 2 END AS tier, GREATEST(similarity(username, $2), similarity(display_name, $2)) AS score FROM users WHERE id IN ((SELECT id FROM users WHERE username ILIKE $1 ORDER BY username <-> $2, id LIMIT $8) UNION ALL (SELECT id FROM users WHERE display_name ILIKE $1 ORDER BY display_name <-> $2, id LIMIT $8) UNION ALL (SELECT id FROM users WHERE lower(username) LIKE lower($3) ORDER BY lower(username) USING ~<~ LIMIT $8) UNION ALL (SELECT id FROM users WHERE lower(display_name) LIKE lower($3) ORDER BY lower(display_name) USING ~<~ LIMIT $8))) s WHERE $4::int IS NULL OR tier > $4 OR (tier = $4 AND (score < $5::real OR (score = $5 AND id > $6::text))) ORDER BY tier, score DESC, id LIMIT $7",
+    # Запросы короче триграммы ищутся только по префиксу: кандидаты — первые $7 строк по каждому полю в порядке text_pattern_ops-индексов
+    'user_search_prefix': "SELECT id, username, display_name, avatar_url, is_verified, is_admin, tier, score FROM (SELECT id, username, display_name, avatar_url, is_verified, is_admin, CASE WHEN lower(username) = lower($2) OR lower(display_name) = lower($2) THEN 0 ELSE 1 END AS tier, GREATEST(similarity(username, $2), similarity(display_name, $2)) AS score FROM users WHERE id IN ((SELECT id FROM users WHERE lower(username) LIKE lower($1) ORDER BY lower(username) USING ~<~ LIMIT $7) UNION ALL (SELECT id FROM users WHERE lower(display_name) LIKE lower($1) ORDER BY lower(display_name) USING ~<~ LIMIT $7))) s WHERE $3::int IS NULL OR tier > $3 OR (tier = $3 AND (score < $4::real OR (score = $4 AND id > $5::text))) ORDER BY tier, score DESC, id LIMIT $6",
+
+    # === VERIFICATION ===
+    'verification_pending_for_user': "SELECT id FROM verification_requests WHERE user_id = $1 AND status = 'pending'",
+    'verification_insert': "INSERT INTO verification_requests (id, user_id, reason) VALUES ($1, $2, $3)",
+    'verification_list': "SELECT vr.id, vr.reason, vr.status, vr.created_at, u.id, u.username, u.display_name, u.avatar_url FROM verification_requests vr JOIN users u ON u.id = vr.user_id WHERE vr.status = 'pending' ORDER BY vr.created_at ASC",
+    'verification_pending_by_id': "SELECT user_id FROM verification_requests WHERE id = $1 AND status = 'pending'",
+    'verification_review': "UPDATE verification_requests SET status = $2, reviewed_by = $3, reviewed_at = NOW() WHERE id = $1",
+    'user_set_verified': "UPDATE users SET is_verified = true WHERE id = $1",
+
+    # === NOTIFICATIONS ===
+    'notification_insert': "INSERT INTO notifications (id, user_id, type, from_user_id, post_id, comment_id, message) VALUES ($1, $2, $3, $4, $5, $6, $7)",
+    # Лайки одного поста, пока получатель их не прочитал, копятся в одной записи
+    'notification_like_upsert': "INSERT INTO notifications (id, user_id, type, from_user_id, post_id, message) VALUES ($1, $2, 'like', $3, $4, $5) ON CONFLICT (user_id, post_id) WHERE type = 'like' AND is_read = false DO UPDATE SET actors_count = notifications.actors_count + CASE WHEN notifications.from_user_id = EXCLUDED.from_user_id THEN 0 ELSE 1 END, from_user_id = EXCLUDED.from_user_id, message = EXCLUDED.message, created_at = NOW()",
+    'notifications_first': "SELECT n.id, n.type, n.message, n.is_read, n.created_at, n.post_id, n.comment_id, COALESCE(u.username,''), COALESCE(u.display_name,''), COALESCE(u.avatar_url,''), COALESCE(u.is_verified, false), n.actors_count FROM notifications n LEFT JOIN users u ON u.id = n.from_user_id WHERE n.user_id = $1 ORDER BY n.created_at DESC, n.id DESC LIMIT $2",
+    'notifications_after': "SELECT n.id, n.type, n.message, n.is_read, n.created_at, n.post_id, n.comment_id, COALESCE(u.username,''), COALESCE(u.display_name,''), COALESCE(u.avatar_url,''), COALESCE(u.is_verified, false), n.actors_count FROM notifications n LEFT JOIN users u ON u.id = n.from_user_id WHERE n.user_id = $1 AND (n.created_at, n.id) < ($2::timestamp, $3::text) ORDER BY n.created_at DESC, n.id DESC LIMIT $4",
+    'notifications_unread_count': "SELECT COUNT(*) FROM notifications WHERE user_id = $1 AND is_read = false",
+    'notifications_read_all': "UPDATE notifications SET is_read = true WHERE user_id = $1 AND is_read = false",
+}
+
+def _placeholders(n):
+    return ' (%s)' % ', '.join(['%s'] * n) if n else ''
+
+def run(cur, name, *params):
+    """Выполняет запрос name; при первом использовании на соединении PREPARE уходит тем же раунд-трипом, что и EXECUTE"""
+    conn = cur.connection
+    execute = 'EXECUTE %s%s' % (name, _placeholders(len(params)))
+    if name in conn.prepared:
+        try:
+            cur.execute(execute, params or None)
+        except psycopg2.Error as e:
+            if e.pgcode == INVALID_STATEMENT_NAME:
+                conn.prepared.discard(name)
+            raise
+        return cur
+    prepare = 'PREPARE %s AS %s; ' % (name, STATEMENTS[name])
+    try:
+        cur.execute((prepare.replace('%', '%%') if params else prepare) + execute, params or None)
+    except psycopg2.Error:
+        # По ошибке не понять, успел ли выполниться PREPARE (и он не откатывается вместе с транзакцией),
+        # поэтому пул при возврате сбросит все подготовленные запросы соединения
+        conn.reset_prepared = True
+        raise
+    conn.prepared.add(name)
+    return cur
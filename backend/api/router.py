@@ -0,0 +1,55 @@
+"""Таблица маршрутов API: (route, method) -> обработчик, плюс разобранный запрос, общий для всех маршрутов"""
+
+import json
+import base64
+
+ROUTES = {}
+
+class Route:
+    __slots__ = ('fn', 'auth', 'admin', 'db')
+
+    def __init__(self, fn, auth, admin, db):
+        self.fn = fn
+        self.auth = auth
+        self.admin = admin
+        self.db = db
+
+def route(path, method, auth=False, admin=False, db=True):
+    """Регистрирует обработчик; auth — нужен пользователь (401), admin — нужен админ (403), db — нужно соединение"""
+    def register(fn):
+        ROUTES[(path, method)] = Route(fn, auth, admin, db)
+        return fn
+    return register
+
+class Request:
+    """Разобранное событие: метод, query-параметры, JSON-тело, токен; пользователь грузится лениво"""
+
+    def __init__(self, event, user_loader):
+        self.method = event.get('httpMethod', 'GET')
+        self.qs = event.get('queryStringParameters') or {}
+        self.path = self.qs.get('route', '/')
+        self.body = parse_body(event)
+        headers = event.get('headers') or {}
+        self.token = headers.get('X-Authorization') or headers.get('x-authorization') or headers.get('Authorization') or headers.get('authorization') or ''
+        self.conn = None
+        self.cur = None
+        self._user_loader = user_loader
+        self._user = False
+
+    @property
+    def user(self):
+        if self._user is False:
+            self._user = self._user_loader(self.conn, self.token)
+        return self._user
+
+def parse_body(event):
+    if not event.get('body'):
+        return {}
+    try:
+        raw = event['body']
+        if event.get('isBase64Encoded'):
+            raw = base64.b64decode(raw).decode()
+        body = json.loads(raw)
+        return body if isinstance(body, dict) else {}
+    except (ValueError, TypeError):
+        return {}
@@ -0,0 +1,76 @@
+"""Сериализация ответов в JSON: orjson, если он установлен, иначе stdlib json
+
+Даты отдаются в ISO 8601 в обоих вариантах. Строки выборки кодируются RowEncoder сразу в JSON-текст —
+без промежуточного dict на каждую строку; такие фрагменты можно кэшировать и склеивать в тело ответа.
+"""
+
+import json
+from datetime import date, datetime
+from json.encoder import encode_basestring
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default).decode()
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+
+    def dumps(obj):
+        return _encoder.encode(obj)
+
+# Кодировщики значений по точному типу; всё прочее (float, Decimal, date, ...) уходит в dumps.
+# Для None и bool — __getitem__ словаря: вызов без кадра Python-функции
+_LITERAL = {None: 'null', True: 'true', False: 'false'}.__getitem__
+_VALUE = {
+    str: encode_basestring,
+    int: int.__repr__,
+    bool: _LITERAL,
+    type(None): _LITERAL,
+    datetime: lambda v: '"%s"' % v.isoformat(),
+}
+
+class RowEncoder:
+    """Кодирует кортежи из fetchall() в JSON-объекты с ключами columns (по порядку колонок выборки)
+
+    constants — члены с одинаковым значением во всех объектах, дописываются после колонок.
+    Без orjson ключи и константы склеены в шаблон заранее, а значения кодируются по типу и подставляются в него;
+    с orjson строки отдаются ему одним вызовом через dict(zip(...)) — это быстрее любого разбора на Python.
+    """
+
+    def __init__(self, columns, **constants):
+        self.columns = tuple(columns)
+        self.constants = constants
+        members = ['%s:%%s' % encode_basestring(c).replace('%', '%%') for c in self.columns]
+        members += [('%s:%s' % (encode_basestring(k), dumps(v))).replace('%', '%%') for k, v in constants.items()]
+        self.template = '{%s}' % ','.join(members)
+
+    def encode(self, row):
+        """Одна строка -> JSON-объект"""
+        if orjson is not None:
+            return orjson.dumps(dict(zip(self.columns, row), **self.constants), default=_default).decode()
+        value = _VALUE.get
+        return self.template % tuple([value(type(v), dumps)(v) for v in row])
+
+    def encode_many(self, rows):
+        """Строки -> JSON-массив объектов"""
+        if orjson is not None:
+            columns, constants = self.columns, self.constants
+            return orjson.dumps([dict(zip(columns, r), **constants) for r in rows], default=_default).decode()
+        return array([self.encode(r) for r in rows])
+
+def array(items):
+    """JSON-массив из уже закодированных элементов"""
+    return '[%s]' % ','.join(items)
+
+def extend(obj_json, members):
+    """Дописывает готовые члены в закодированный объект: extend('{"a":1}', '"b":2') -> '{"a":1,"b":2}'"""
+    return '%s,%s}' % (obj_json[:-1], members)
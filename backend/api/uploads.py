@@ -0,0 +1,172 @@
+"""Загрузка изображений: лимит размера, декодирование base64 без лишних копий, определение типа, превью"""
+
+import io
+import os
+import binascii
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', str(24 * 1000 * 1000)))
+DECODE_CHUNK = 64 * 1024
+AVATAR_SIZE = 128
+FEED_SIZE = 1080
+
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'GIF87a', 'image/gif', 'gif'),
+    (b'GIF89a', 'image/gif', 'gif'),
+)
+
+class UploadError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class BufferReader:
+    """Файловый объект поверх буфера — чтобы Pillow и boto3 читали его без копии в BytesIO"""
+
+    def __init__(self, buf):
+        self._view = memoryview(buf)
+        self._pos = 0
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return chunk
+
+    def seek(self, offset, whence=0):
+        base = {0: 0, 1: self._pos, 2: len(self._view)}[whence]
+        self._pos = max(0, min(len(self._view), base + offset))
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def __len__(self):
+        return len(self._view)
+
+def decode_image(data, max_bytes=MAX_UPLOAD_BYTES):
+    """data URL или голый base64 -> bytearray; размер проверяется до декодирования, декодируется кусками"""
+    start = data.find(',', 0, 256) + 1
+    payload_len = len(data) - start
+    padding = data.count('=', max(start, len(data) - 2))
+    size = payload_len // 4 * 3 - padding
+    if payload_len % 4 or size <= 0:
+        raise UploadError(400, 'Повреждённое изображение')
+    if size > max_bytes:
+        raise UploadError(413, 'Файл больше %d МБ' % (max_bytes // (1024 * 1024)))
+    out = bytearray(size)
+    view = memoryview(out)
+    pos = 0
+    try:
+        for i in range(start, len(data), DECODE_CHUNK):
+            chunk = binascii.a2b_base64(data[i:i + DECODE_CHUNK])
+            view[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+    except (binascii.Error, ValueError):
+        raise UploadError(400, 'Повреждённое изображение')
+    if pos != size:
+        raise UploadError(400, 'Повреждённое изображение')
+    return out
+
+def sniff_type(buf):
+    """(content_type, расширение) по сигнатуре файла, а не по тому, что прислал клиент"""
+    head = bytes(buf[:16])
+    for magic, content_type, ext in SIGNATURES:
+        if head.startswith(magic):
+            return content_type, ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    raise UploadError(400, 'Поддерживаются только JPEG, PNG, GIF и WebP')
+
+def make_variant(buf, size, square=False, max_pixels=MAX_IMAGE_PIXELS):
+    """JPEG-превью со стороной не больше size; без Pillow возвращает None"""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    try:
+        img = Image.open(BufferReader(buf))
+        img.draft('RGB', (size, size))
+        # Размеры известны из заголовка до декодирования; draft() уменьшает их только для JPEG
+        width, height = img.size
+        if width * height > max_pixels:
+            raise UploadError(413, 'Изображение больше %d Мп' % (max_pixels // 1000000))
+        img = ImageOps.exif_transpose(img)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise UploadError(400, 'Не удалось прочитать изображение')
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    if square:
+        img = ImageOps.fit(img, (size, size), Image.LANCZOS)
+    else:
+        img.thumbnail((size, size), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+    return out.getbuffer()
+
+class S3Storage:
+    def __init__(self):
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('s3', endpoint_url='https://bucket.poehali.dev', aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'], aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'])
+        return self._client
+
+    def put(self, key, buf, content_type):
+        self.client().put_object(Bucket='files', Key=key, Body=BufferReader(buf), ContentLength=len(buf), ContentType=content_type)
+        return 'https://cdn.poehali.dev/projects/%s/bucket/%s' % (os.environ['AWS_ACCESS_KEY_ID'], key)
+
+class LocalStorage:
+    """Файловая замена S3 для локального запуска и бенчмарков"""
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+
+    def put(self, key, buf, content_type):
+        path = os.path.join(self.root, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(buf)
+        return '%s/%s' % (self.base_url, key)
+
+_storage = None
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        if os.environ.get('STORAGE_BACKEND') == 'local':
+            root = os.environ.get('LOCAL_STORAGE_DIR', '/tmp/online-uploads')
+            _storage = LocalStorage(root, os.environ.get('LOCAL_STORAGE_URL', 'file://' + root))
+        else:
+            _storage = S3Storage()
+    return _storage
+
+def store_image(data, base_key, variant_size, square=False):
+    """Сохраняет оригинал в <base_key>/orig.<ext> и превью в <base_key>/<size>.jpg; возвращает их URL.
+    Без Pillow превью нет, и url совпадает с original_url"""
+    buf = decode_image(data)
+    content_type, ext = sniff_type(buf)
+    variant = make_variant(buf, variant_size, square=square)
+    storage = get_storage()
+    original_url = storage.put('%s/orig.%s' % (base_key, ext), buf, content_type)
+    del buf
+    if variant is None:
+        return {'url': original_url, 'original_url': original_url}
+    return {'url': storage.put('%s/%d.jpg' % (base_key, variant_size), variant, 'image/jpeg'), 'original_url': original_url}
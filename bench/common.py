@@ -0,0 +1,207 @@
+"""Общие утилиты бенчмарков: одноразовый Postgres, миграции, сиды, подсчёт запросов и перцентили"""
+
+import os
+import sys
+import glob
+import time
+import uuid
+import shutil
+import socket
+import random
+import hashlib
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(ROOT, 'db_migrations')
+API_DIR = os.path.join(ROOT, 'backend', 'api')
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+from db import Connection, ConnectionPool
+import maintenance
+
+
+class QueryCounter:
+    """Счётчик SQL-запросов, которые прошли через CountingCursor"""
+
+    def __init__(self):
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+
+COUNTER = QueryCounter()
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Курсор, считающий execute() — то есть раунд-трипы к БД; первый PREPARE уходит вместе с EXECUTE"""
+
+    def execute(self, query, vars=None):
+        COUNTER.count += 1
+        return super().execute(query, vars)
+
+
+def _pg_bin(name):
+    found = shutil.which(name)
+    if found:
+        return found
+    try:
+        bindir = subprocess.check_output(['pg_config', '--bindir'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    path = os.path.join(bindir, name)
+    return path if os.path.exists(path) else None
+
+
+@contextlib.contextmanager
+def database():
+    """URL бенчмарк-БД: BENCH_DATABASE_URL, а если он не задан — временный кластер initdb/pg_ctl, удаляемый после запуска"""
+    url = os.environ.get('BENCH_DATABASE_URL')
+    if url:
+        yield url
+        return
+    initdb, pg_ctl = _pg_bin('initdb'), _pg_bin('pg_ctl')
+    if not initdb or not pg_ctl:
+        sys.exit('Нет ни BENCH_DATABASE_URL, ни initdb/pg_ctl для временного Postgres')
+    datadir = tempfile.mkdtemp(prefix='online-bench-')
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    subprocess.check_call([initdb, '-D', datadir, '-U', 'bench', '--auth=trust', '-E', 'UTF8'], stdout=subprocess.DEVNULL)
+    subprocess.check_call([pg_ctl, '-D', datadir, '-w', '-l', os.path.join(datadir, 'server.log'),
+                           '-o', "-p %d -k %s -c listen_addresses='' -c fsync=off" % (port, datadir), 'start'], stdout=subprocess.DEVNULL)
+    try:
+        yield 'postgresql://bench@/postgres?host=%s&port=%d' % (datadir, port)
+    finally:
+        subprocess.call([pg_ctl, '-D', datadir, '-m', 'immediate', 'stop'], stdout=subprocess.DEVNULL)
+        shutil.rmtree(datadir, ignore_errors=True)
+
+
+def connect(url):
+    return psycopg2.connect(url, connection_factory=Connection, cursor_factory=CountingCursor)
+
+
+def reset_schema(conn):
+    """Пересоздаёт схему public и накатывает все миграции из db_migrations по порядку"""
+    cur = conn.cursor()
+    cur.execute('DROP SCHEMA public CASCADE')
+    cur.execute('CREATE SCHEMA public')
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*.sql'))):
+        with open(path) as f:
+            cur.execute(f.read())
+    conn.commit()
+
+
+def seed(conn, users=1000, posts=10000, likes=50000, comments=20000, notifications=20000, private_share=0.1, reply_share=0.3, seed_value=42):
+    """Наполняет БД данными с перекосом: немногие авторы пишут большую часть постов, немногие свежие посты собирают
+    большую часть лайков и комментариев. Денормализованные счётчики и лента приводятся в порядок командами maintenance."""
+    rnd = random.Random(seed_value)
+    cur = conn.cursor()
+    start = datetime.now() - timedelta(days=365)
+    pw_hash = hashlib.sha256(b'benchmark').hexdigest()
+
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    execute_values(cur, "INSERT INTO users (id, username, email, password_hash, display_name, is_private) VALUES %s",
+                   [(uid, 'user%d' % i, 'user%d@bench.local' % i, pw_hash, 'User %d' % i, rnd.random() < private_share) for i, uid in enumerate(user_ids)])
+
+    post_rows = []
+    for i in range(posts):
+        author = user_ids[min(int(rnd.paretovariate(1.2)) - 1, users - 1)]
+        post_rows.append((str(uuid.uuid4()), author, 'Пост %d' % i, start + timedelta(seconds=i * 365 * 86400 // max(posts, 1))))
+    execute_values(cur, "INSERT INTO posts (id, user_id, content, created_at) VALUES %s", post_rows)
+    post_ids = [r[0] for r in post_rows]
+
+    def skewed_post():
+        return post_ids[-min(int(rnd.paretovariate(0.8)), posts)]
+
+    like_pairs = set()
+    while len(like_pairs) < min(likes, users * posts):
+        like_pairs.add((skewed_post(), rnd.choice(user_ids)))
+    execute_values(cur, "INSERT INTO likes (id, post_id, user_id) VALUES %s",
+                   [(str(uuid.uuid4()), pid, uid) for pid, uid in like_pairs])
+
+    comment_rows = []
+    thread = {}
+    for i in range(comments):
+        pid = skewed_post()
+        siblings = thread.setdefault(pid, [])
+        parent = rnd.choice(siblings) if siblings and rnd.random() < reply_share else None
+        cid = str(uuid.uuid4())
+        siblings.append(cid)
+        comment_rows.append((cid, pid, rnd.choice(user_ids), 'Комментарий %d' % i, parent))
+    execute_values(cur, "INSERT INTO comments (id, post_id, user_id, content, parent_id) VALUES %s", comment_rows)
+
+    owner = {r[0]: r[1] for r in post_rows}
+    likers = {}
+    for pid, uid in like_pairs:
+        if uid != owner[pid]:
+            likers.setdefault(pid, []).append(uid)
+    notif_rows = [(str(uuid.uuid4()), owner[pid], 'like', uids[-1], pid, None, 'лайк', len(uids), rnd.random() < 0.5) for pid, uids in likers.items()]
+    notif_rows += [(str(uuid.uuid4()), owner[c[1]], 'comment', c[2], c[1], c[0], 'комментарий', 1, rnd.random() < 0.7) for c in comment_rows if c[2] != owner[c[1]]]
+    rnd.shuffle(notif_rows)
+    execute_values(cur, "INSERT INTO notifications (id, user_id, type, from_user_id, post_id, comment_id, message, actors_count, is_read) VALUES %s", notif_rows[:notifications])
+
+    tokens = [str(uuid.uuid4()) for _ in user_ids]
+    execute_values(cur, "INSERT INTO sessions (user_id, token) VALUES %s", list(zip(user_ids, tokens)))
+    conn.commit()
+    maintenance.reconcile_counters(conn, repair=True)
+    maintenance.reconcile_reply_counters(conn, repair=True)
+    maintenance.rebuild_timeline(conn)
+    cur.execute('ANALYZE')
+    conn.commit()
+    cur.execute("SELECT id FROM comments WHERE replies_count > 0")
+    threads = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT username FROM users WHERE id = ANY(%s)", (user_ids,))
+    usernames = [r[0] for r in cur.fetchall()]
+    conn.commit()
+    return {'user_ids': user_ids, 'post_ids': post_ids, 'tokens': tokens, 'usernames': usernames, 'threads': threads}
+
+
+def load_api():
+    """Импортирует backend/api/index.py как модуль"""
+    import index
+    return index
+
+
+def install_pool(api, url):
+    """Подменяет пул хендлера на пул к бенчмарк-БД, считающий запросы"""
+    api.POOL = ConnectionPool(lambda: connect(url), max_size=2)
+    return api.POOL
+
+
+def event(route, method='GET', token=None, body=None, **params):
+    import json
+    headers = {'X-Authorization': 'Bearer %s' % token} if token else {}
+    return {'httpMethod': method, 'queryStringParameters': dict(params, route=route), 'headers': headers,
+            'body': json.dumps(body) if body is not None else None}
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def measure(fn, iterations):
+    """Запускает fn iterations раз; возвращает задержки (мс) и среднее число запросов на вызов"""
+    latencies = []
+    COUNTER.reset()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies, COUNTER.count / float(iterations)
+
+
+def summary(name, latencies, queries):
+    return '%-28s queries/req=%6.1f  p50=%8.2f ms  p99=%8.2f ms' % (name, queries, percentile(latencies, 50), percentile(latencies, 99))
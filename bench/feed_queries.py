@@ -0,0 +1,92 @@
+"""Бенчмарк ленты и профиля: старый путь (N+1 и коррелированные COUNT) против пакетного
+
+    BENCH_DATABASE_URL=postgresql://localhost/online_bench python bench/feed_queries.py --posts 20000
+"""
+
+import os
+import argparse
+
+from common import database, connect, reset_schema, seed, load_api, install_pool, event, measure, summary
+
+
+SESSION_SQL = "SELECT u.id, u.username, u.email, u.display_name, u.bio, u.avatar_url, u.is_private, u.is_verified, u.is_admin FROM users u JOIN sessions s ON s.user_id = u.id WHERE s.token = '%s' LIMIT 1"
+
+
+def legacy_feed(conn, token, viewer_id):
+    cur = conn.cursor()
+    cur.execute("SELECT p.id, p.content, p.image_url, p.created_at, p.user_id, u.username, u.display_name, u.avatar_url, u.is_verified, (SELECT COUNT(*) FROM likes WHERE post_id = p.id), (SELECT COUNT(*) FROM comments WHERE post_id = p.id) FROM posts p JOIN users u ON u.id = p.user_id WHERE u.is_private = false ORDER BY p.created_at DESC LIMIT 20 OFFSET 0")
+    rows = cur.fetchall()
+    cur.execute(SESSION_SQL % token)
+    cur.fetchone()
+    for r in rows:
+        cur.execute("SELECT id FROM likes WHERE post_id = '%s' AND user_id = '%s'" % (r[0], viewer_id))
+        cur.fetchone()
+
+
+def legacy_profile(conn, token, author_id, viewer_id):
+    cur = conn.cursor()
+    cur.execute("SELECT id, username, display_name, bio, avatar_url, is_private, is_verified, is_admin, created_at FROM users WHERE id = '%s'" % author_id)
+    cur.fetchone()
+    cur.execute(SESSION_SQL % token)
+    cur.fetchone()
+    cur.execute("SELECT p.id, p.content, p.image_url, p.created_at, (SELECT COUNT(*) FROM likes WHERE post_id = p.id), (SELECT COUNT(*) FROM comments WHERE post_id = p.id) FROM posts p WHERE p.user_id = '%s' ORDER BY p.created_at DESC LIMIT 50" % author_id)
+    for pr in cur.fetchall():
+        cur.execute("SELECT id FROM likes WHERE post_id = '%s' AND user_id = '%s'" % (pr[0], viewer_id))
+        cur.fetchone()
+    cur.execute("SELECT COUNT(*) FROM posts WHERE user_id = '%s'" % author_id)
+    cur.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--likes', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    with database() as url:
+        conn = connect(url)
+        reset_schema(conn)
+        data = seed(conn, users=args.users, posts=args.posts, likes=args.likes, comments=args.comments)
+        viewer = 0
+        token = data['tokens'][viewer]
+        viewer_id = data['user_ids'][viewer]
+        author_id = data['user_ids'][0]
+        cur = conn.cursor()
+        cur.execute("SELECT username FROM users WHERE id = '%s'" % author_id)
+        author = cur.fetchone()[0]
+        cur.execute("UPDATE users SET is_private = false WHERE id = '%s'" % author_id)
+        # Старый запрос ленты шёл по idx_posts_created, который V0008 удалила: возвращаем его, чтобы «до» мерилось честно
+        cur.execute('CREATE INDEX idx_posts_created ON posts(created_at DESC)')
+        conn.commit()
+
+        # Сравниваем запросы к БД, а не попадания в кэши ленты и сессий
+        os.environ['FEED_CACHE_TTL'] = '0'
+        os.environ['SESSION_CACHE_TTL'] = '0'
+        api = load_api()
+        install_pool(api, url)
+
+        def before_feed():
+            legacy_feed(conn, token, viewer_id)
+
+        def after_feed():
+            api.handler(event('/posts', token=token), None)
+
+        def before_profile():
+            legacy_profile(conn, token, author_id, viewer_id)
+
+        def after_profile():
+            api.handler(event('/profile', token=token, username=author), None)
+
+        for name, fn in (('GET /posts before', before_feed), ('GET /posts after', after_feed),
+                         ('GET /profile before', before_profile), ('GET /profile after', after_profile)):
+            fn()
+            latencies, queries = measure(fn, args.iterations)
+            print(summary(name, latencies, queries))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Нагрузочный прогон хендлера api на смешанном профиле запросов со сравнением против сохранённого baseline.
+
+Поднимает временный Postgres (или берёт BENCH_DATABASE_URL), применяет миграции, наполняет БД данными
+с перекосом (вирусные посты, активные авторы) и вызывает handler(event, context) напрямую — без HTTP.
+По каждому маршруту печатает число вызовов, ошибки, p50/p95/p99 и SQL-запросы на вызов.
+
+    python bench/loadtest.py --requests 5000 --save-baseline
+    python bench/loadtest.py --requests 5000 --baseline bench/baseline.json
+
+При сравнении рост задержки больше --tolerance (и больше --noise-ms по абсолютной величине) или любой рост
+числа SQL-запросов на вызов считается регрессией: скрипт печатает РЕГРЕССИЯ и выходит с кодом 1.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+from common import COUNTER, database, connect, reset_schema, seed, load_api, install_pool, event, percentile
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# (имя, вес) — доля запроса в смешанном профиле; чтение ленты и счётчика уведомлений доминирует
+PROFILE = [
+    ('GET /posts', 30),
+    ('GET /posts cursor', 8),
+    ('GET /auth/me', 10),
+    ('GET /notifications/unread_count', 12),
+    ('GET /comments', 10),
+    ('GET /comments/thread', 2),
+    ('GET /profile', 8),
+    ('GET /search', 6),
+    ('POST /likes', 7),
+    ('POST /comments', 3),
+    ('POST /posts', 1),
+    ('GET /notifications', 2),
+    ('POST /notifications/read', 1),
+]
+
+ANONYMOUS_SHARE = 0.2
+
+# p99 по паре сотен вызовов — это два-три самых медленных запроса, сравнивать его имеет смысл только на объёме
+P99_MIN_COUNT = 1000
+
+
+class Workload:
+    """Генерирует события хендлера по профилю; пользователи и посты выбираются с перекосом"""
+
+    def __init__(self, data, feed_cursors, seed_value):
+        self.rnd = random.Random(seed_value)
+        self.data = data
+        self.feed_cursors = feed_cursors
+        skip = {name for name, empty in (('GET /comments/thread', not data['threads']), ('GET /posts cursor', not feed_cursors)) if empty}
+        profile = [(name, weight) for name, weight in PROFILE if name not in skip]
+        self.names = [name for name, _ in profile]
+        self.weights = [weight for _, weight in profile]
+
+    def user(self):
+        return min(int(self.rnd.paretovariate(1.1)) - 1, len(self.data['tokens']) - 1)
+
+    def token(self):
+        return self.data['tokens'][self.user()]
+
+    def post(self):
+        post_ids = self.data['post_ids']
+        return post_ids[-min(int(self.rnd.paretovariate(0.8)), len(post_ids))]
+
+    def next(self):
+        name = self.rnd.choices(self.names, self.weights)[0]
+        rnd = self.rnd
+        if name == 'GET /posts':
+            return name, event('/posts', token=None if rnd.random() < ANONYMOUS_SHARE else self.token())
+        if name == 'GET /posts cursor':
+            return name, event('/posts', token=self.token(), cursor=rnd.choice(self.feed_cursors))
+        if name == 'GET /auth/me':
+            return name, event('/auth/me', token=self.token())
+        if name == 'GET /notifications/unread_count':
+            return name, event('/notifications/unread_count', token=self.token())
+        if name == 'GET /comments':
+            return name, event('/comments', token=self.token(), post_id=self.post())
+        if name == 'GET /comments/thread':
+            return name, event('/comments/thread', token=self.token(), comment_id=rnd.choice(self.data['threads']))
+        if name == 'GET /profile':
+            return name, event('/profile', token=self.token(), username=self.data['usernames'][self.user()])
+        if name == 'GET /search':
+            return name, event('/search', token=self.token(), q='user%d' % rnd.randint(1, 99))
+        if name == 'POST /likes':
+            return name, event('/likes', 'POST', self.token(), {'post_id': self.post()})
+        if name == 'POST /comments':
+            return name, event('/comments', 'POST', self.token(), {'post_id': self.post(), 'content': 'Нагрузочный комментарий'})
+        if name == 'POST /posts':
+            return name, event('/posts', 'POST', self.token(), {'content': 'Нагрузочный пост'})
+        if name == 'GET /notifications':
+            return name, event('/notifications', token=self.token())
+        return name, event('/notifications/read', 'POST', self.token(), {})
+
+
+def feed_cursors(api, pages):
+    """Курсоры первых pages страниц ленты: с одним курсором GET /posts cursor мерил бы только попадания в FEED_CACHE"""
+    cursors = []
+    cursor = None
+    for _ in range(pages):
+        page = json.loads(api.handler(event('/posts', cursor=cursor), None)['body'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+        cursors.append(cursor)
+    api.FEED_CACHE.clear()
+    return cursors
+
+
+def run_workload(api, workload, requests):
+    """Прогоняет requests событий; возвращает сводку по маршрутам и общую пропускную способность"""
+    samples = {}
+    started = time.perf_counter()
+    for _ in range(requests):
+        name, ev = workload.next()
+        COUNTER.reset()
+        t0 = time.perf_counter()
+        result = api.handler(ev, None)
+        elapsed = (time.perf_counter() - t0) * 1000
+        s = samples.setdefault(name, {'latencies': [], 'queries': 0, 'errors': 0})
+        s['latencies'].append(elapsed)
+        s['queries'] += COUNTER.count
+        if result['statusCode'] >= 400:
+            s['errors'] += 1
+    total = time.perf_counter() - started
+    routes = {}
+    for name, s in sorted(samples.items()):
+        lat = s['latencies']
+        routes[name] = {
+            'count': len(lat),
+            'errors': s['errors'],
+            'p50_ms': round(percentile(lat, 50), 3),
+            'p95_ms': round(percentile(lat, 95), 3),
+            'p99_ms': round(percentile(lat, 99), 3),
+            'mean_ms': round(sum(lat) / len(lat), 3),
+            'queries_per_req': round(s['queries'] / float(len(lat)), 2),
+        }
+    return {'requests': requests, 'seconds': round(total, 3), 'rps': round(requests / total, 1), 'routes': routes}
+
+
+def print_report(report):
+    print('%-34s %6s %6s %9s %9s %9s %9s' % ('route', 'count', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'sql/req'))
+    for name, r in report['routes'].items():
+        print('%-34s %6d %6d %9.2f %9.2f %9.2f %9.2f' % (name, r['count'], r['errors'], r['p50_ms'], r['p95_ms'], r['p99_ms'], r['queries_per_req']))
+    print('Всего: %d запросов за %.1f с, %.1f req/s' % (report['requests'], report['seconds'], report['rps']))
+
+
+def compare(report, baseline, tolerance, noise_ms):
+    """Сравнивает отчёт с baseline; возвращает список описаний регрессий"""
+    problems = []
+    if report['rps'] < baseline['rps'] * (1 - tolerance):
+        problems.append('пропускная способность %.1f -> %.1f req/s' % (baseline['rps'], report['rps']))
+    for name, base in baseline['routes'].items():
+        cur = report['routes'].get(name)
+        if not cur:
+            continue
+        if cur['queries_per_req'] > base['queries_per_req'] + 0.01:
+            problems.append('%s: SQL-запросов на вызов %.2f -> %.2f' % (name, base['queries_per_req'], cur['queries_per_req']))
+        if cur['errors'] > base['errors']:
+            problems.append('%s: ошибок %d -> %d' % (name, base['errors'], cur['errors']))
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if key == 'p99_ms' and min(cur['count'], base['count']) < P99_MIN_COUNT:
+                continue
+            if cur[key] > base[key] * (1 + tolerance) and cur[key] - base[key] > noise_ms:
+                problems.append('%s: %s %.2f -> %.2f' % (name, key, base[key], cur[key]))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--likes', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--notifications', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=500)
+    parser.add_argument('--feed-pages', type=int, default=100, help='на скольких страницах ленты брать курсоры для GET /posts cursor')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='записать JSON-отчёт в файл')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help='сохранить отчёт как baseline')
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE, help='сравнить с baseline и упасть при регрессии')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='допустимый рост задержки, доля (0.3 = 30%%)')
+    parser.add_argument('--noise-ms', type=float, default=1.0, help='рост задержки меньше этого порога не считается регрессией')
+    args = parser.parse_args()
+
+    with database() as url:
+        conn = connect(url)
+        reset_schema(conn)
+        data = seed(conn, users=args.users, posts=args.posts, likes=args.likes, comments=args.comments,
+                    notifications=args.notifications, seed_value=args.seed)
+        conn.close()
+
+        api = load_api()
+        pool = install_pool(api, url)
+        workload = Workload(data, feed_cursors(api, args.feed_pages), args.seed)
+        run_workload(api, workload, args.warmup)
+        report = run_workload(api, workload, args.requests)
+        report['dataset'] = {'users': args.users, 'posts': args.posts, 'likes': args.likes,
+                             'comments': args.comments, 'notifications': args.notifications, 'feed_pages': args.feed_pages, 'seed': args.seed}
+        pool.clear()
+
+    print_report(report)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print('Отчёт записан в %s' % path)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('dataset') != report['dataset']:
+            print('ВНИМАНИЕ: baseline снят на другом наборе данных: %s' % baseline.get('dataset'))
+        problems = compare(report, baseline, args.tolerance, args.noise_ms)
+        for p in problems:
+            print('РЕГРЕССИЯ: %s' % p)
+        if problems:
+            sys.exit(1)
+        print('Регрессий относительно %s нет' % args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Микробенчмарк: ad-hoc SQL с подставленными литералами против PREPARE/EXECUTE из queries.py
+
+Сравнивает время планирования (EXPLAIN ANALYZE) и пропускную способность на засеянной БД.
+
+    BENCH_DATABASE_URL=postgresql://localhost/online_bench python bench/prepared_queries.py
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+
+from common import database, connect, reset_schema, seed
+from queries import STATEMENTS, run
+
+
+def adhoc_sql(cur, name, params):
+    """Текст запроса с литералами вместо $n — так строились запросы до queries.py"""
+    literals = [cur.mogrify('%s', (p,)).decode() for p in params]
+    return re.sub(r'\$(\d+)', lambda m: literals[int(m.group(1)) - 1], STATEMENTS[name])
+
+
+def planning_time(cur, sql):
+    cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Planning Time']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    with database() as url:
+        conn = connect(url)
+        reset_schema(conn)
+        data = seed(conn, posts=args.posts, likes=args.posts * 5, comments=args.posts * 2)
+        rnd = random.Random(7)
+        cur = conn.cursor()
+
+        cases = {
+            'user_by_session': lambda: (rnd.choice(data['tokens']),),
+            'feed_first': lambda: (20, 0),
+            'profile_posts': lambda: (rnd.choice(data['user_ids']),),
+            'liked_posts': lambda: (rnd.choice(data['user_ids']), rnd.sample(data['post_ids'], 20)),
+        }
+        print('%-16s %12s %12s %14s %14s' % ('statement', 'plan ad-hoc', 'plan prep.', 'ad-hoc q/s', 'prepared q/s'))
+        for name, make_params in cases.items():
+            plans_adhoc, plans_prepared = [], []
+            for _ in range(20):
+                params = make_params()
+                plans_adhoc.append(planning_time(cur, adhoc_sql(cur, name, params)))
+                run(cur, name, *params)
+                plans_prepared.append(planning_time(cur, 'EXECUTE %s (%s)' % (name, ', '.join(cur.mogrify('%s', (p,)).decode() for p in params))))
+            conn.rollback()
+
+            t0 = time.perf_counter()
+            for _ in range(args.iterations):
+                cur.execute(adhoc_sql(cur, name, make_params()))
+                cur.fetchall()
+            adhoc_qps = args.iterations / (time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            for _ in range(args.iterations):
+                run(cur, name, *make_params()).fetchall()
+            prepared_qps = args.iterations / (time.perf_counter() - t0)
+            conn.rollback()
+
+            print('%-16s %9.3f ms %9.3f ms %14.0f %14.0f' % (name, sum(plans_adhoc) / len(plans_adhoc), sum(plans_prepared) / len(plans_prepared), adhoc_qps, prepared_qps))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""Холодный старт и сериализация ответов функции api.
+
+1. Импорт index в свежем процессе (медиана по --runs запускам) и самые дорогие модули по -X importtime.
+2. Первый запрос в свежем процессе (новое соединение, PREPARE) против тёплого — нужен Postgres,
+   см. common.database(); пропускается с --no-db.
+3. Тело ответа: dict на строку + json.dumps(default=str) против RowEncoder с orjson и без него;
+   /posts — как при попадании в кэш ленты, с полем liked под зрителя.
+
+Варианты: «до» — как было: uuid при импорте, stdlib json, PREPARE отдельным раунд-трипом;
+«stdlib» — без orjson; «orjson» — с ним.
+
+    python bench/startup.py --runs 10
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import statistics
+import subprocess
+import importlib.util
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'backend', 'api')
+
+VARIANTS = (
+    ('до', ['--no-orjson', '--legacy']),
+    ('stdlib', ['--no-orjson']),
+    ('orjson', []),
+)
+
+
+def legacy_run(cur, name, *params):
+    """run() до объединения PREPARE и EXECUTE в один раунд-трип"""
+    from queries import STATEMENTS, _placeholders
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute('PREPARE %s AS %s' % (name, STATEMENTS[name]))
+        conn.prepared.add(name)
+    cur.execute('EXECUTE %s%s' % (name, _placeholders(len(params))), params or None)
+    return cur
+
+
+def child(args):
+    """Выполняется в свежем процессе: импорт index, первый и тёплые запросы; печатает JSON"""
+    if args.no_orjson:
+        sys.modules['orjson'] = None
+    sys.path.insert(0, API_DIR)
+    t0 = time.perf_counter()
+    if args.legacy:
+        __import__('uuid')  # до ленивого new_id() uuid импортировался вместе с index
+    import index
+    result = {'import_ms': (time.perf_counter() - t0) * 1000}
+    if args.url:
+        from common import COUNTER, install_pool, event
+        if args.legacy:
+            index.run = legacy_run
+        install_pool(index, args.url)
+        ev = event('/posts', token=args.token)
+        COUNTER.reset()
+        t0 = time.perf_counter()
+        index.handler(ev, None)
+        result['first_ms'] = (time.perf_counter() - t0) * 1000
+        result['first_statements'] = COUNTER.count
+        warm = []
+        COUNTER.reset()
+        for _ in range(args.warm):
+            t0 = time.perf_counter()
+            index.handler(ev, None)
+            warm.append((time.perf_counter() - t0) * 1000)
+        result['warm_ms'] = statistics.median(warm)
+        result['warm_statements'] = COUNTER.count / float(args.warm)
+    print(json.dumps(result))
+
+
+def spawn(flags, url=None, token=None, warm=200):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child'] + flags
+    if url:
+        cmd += ['--url', url, '--token', token, '--warm', str(warm)]
+    return json.loads(subprocess.check_output(cmd, cwd=BENCH_DIR).decode().strip().splitlines()[-1])
+
+
+def import_breakdown(top=10):
+    """Прямые импорты index по -X importtime: строки глубины 1 между предыдущим модулем верхнего уровня и index"""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import index'], cwd=API_DIR, stderr=subprocess.PIPE, check=True).stderr.decode()
+    children = []
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == 'index':
+                return sorted(children, reverse=True)[:top]
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative) / 1000.0, name.strip()))
+    return []
+
+
+def load_serialize(fast):
+    """Отдельная копия serialize.py — с orjson или с принудительным откатом на stdlib"""
+    spec = importlib.util.spec_from_file_location('serialize_%s' % ('orjson' if fast else 'stdlib'), os.path.join(API_DIR, 'serialize.py'))
+    module = importlib.util.module_from_spec(spec)
+    if fast:
+        spec.loader.exec_module(module)
+        return module
+    saved = sys.modules.get('orjson')
+    sys.modules['orjson'] = None
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        if saved is None:
+            del sys.modules['orjson']
+        else:
+            sys.modules['orjson'] = saved
+    return module
+
+
+def encode_benchmark(iterations):
+    now = datetime.now()
+    posts = [('post-%06d' % i, 'Пост номер %d про что-то интересное' % i, '', now - timedelta(minutes=i), 'user-%d' % i,
+              'user%d' % i, 'Имя Фамилия', None, i % 3 == 0, i * 7, i) for i in range(20)]
+    notifications = [('notif-%06d' % i, 'like', 'поставил лайк', i % 2 == 0, now - timedelta(minutes=i), 'post-%d' % i, None,
+                      'user%d' % i, 'Имя Фамилия', '', False, i % 5 + 1) for i in range(50)]
+
+    page = [{'id': r[0], 'content': r[1], 'image_url': r[2], 'created_at': r[3], 'user_id': r[4], 'username': r[5], 'display_name': r[6], 'avatar_url': r[7], 'is_verified': r[8], 'likes_count': r[9], 'comments_count': r[10], 'liked': False} for r in posts]
+    liked = {r[0] for r in posts[::4]}
+
+    def legacy_posts():
+        return json.dumps({'posts': [dict(p, liked=p['id'] in liked) for p in page], 'next_cursor': None}, default=str)
+
+    def legacy_notifications():
+        return json.dumps({'notifications': [{'id': r[0], 'type': r[1], 'message': r[2], 'is_read': r[3], 'created_at': r[4], 'post_id': r[5], 'comment_id': r[6], 'from_username': r[7], 'from_display_name': r[8], 'from_avatar_url': r[9], 'from_is_verified': r[10], 'actors_count': r[11]} for r in notifications], 'next_cursor': None}, default=str)
+
+    cases = [('до', legacy_posts, legacy_notifications)]
+    for name, fast in (('stdlib', False), ('orjson', True)):
+        s = load_serialize(fast)
+        if fast and s.orjson is None:
+            continue
+        post_json = s.RowEncoder(('id', 'content', 'image_url', 'created_at', 'user_id', 'username', 'display_name', 'avatar_url', 'is_verified', 'likes_count', 'comments_count'))
+        notification_json = s.RowEncoder(('id', 'type', 'message', 'is_read', 'created_at', 'post_id', 'comment_id', 'from_username', 'from_display_name', 'from_avatar_url', 'from_is_verified', 'actors_count'))
+        fragments = [(r[0], post_json.encode(r)) for r in posts]
+        cases.append((name,
+                      lambda s=s, f=fragments: '{"posts":%s,"next_cursor":null}' % s.array([s.extend(p, '"liked":true' if i in liked else '"liked":false') for i, p in f]),
+                      lambda s=s, e=notification_json: '{"notifications":%s,"next_cursor":null}' % e.encode_many(notifications)))
+
+    print('\nТело ответа, мкс на страницу (размер, байт); /posts — из кэша страницы с полем liked под зрителя')
+    for name, fn_posts, fn_notifications in cases:
+        cells = []
+        for fn in (fn_posts, fn_notifications):
+            assert json.loads(fn())
+            best = min(timeit.repeat(fn, number=max(iterations // 10, 1), repeat=10)) / max(iterations // 10, 1)
+            cells.append('%8.1f (%5d)' % (best * 1e6, len(fn().encode())))
+        print('%-8s /posts x20 %s   /notifications x50 %s' % (name, cells[0], cells[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5, help='свежих процессов на вариант')
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--no-db', action='store_true', help='только импорт и кодирование, без Postgres')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--no-orjson', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--legacy', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--token', help=argparse.SUPPRESS)
+    parser.add_argument('--warm', type=int, default=200, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    print('Импорт index в свежем процессе, мс (медиана по %d запускам)' % args.runs)
+    for name, flags in VARIANTS:
+        samples = [spawn(flags)['import_ms'] for _ in range(args.runs)]
+        print('%-8s %8.1f' % (name, statistics.median(samples)))
+    print('\nСамые дорогие импорты, мс (cumulative)')
+    for ms, module in import_breakdown():
+        print('  %-24s %8.1f' % (module, ms))
+
+    if not args.no_db:
+        from common import database, connect, reset_schema, seed
+        with database() as url:
+            conn = connect(url)
+            reset_schema(conn)
+            data = seed(conn, users=200, posts=2000, likes=10000, comments=4000, notifications=4000)
+            conn.close()
+            print('\nGET /posts в свежем процессе: первый запрос против тёплого')
+            print('%-8s %10s %8s %10s %8s' % ('', 'first ms', 'sql', 'warm ms', 'sql'))
+            for name, flags in VARIANTS:
+                runs = [spawn(flags, url, data['tokens'][0]) for _ in range(args.runs)]
+                print('%-8s %10.2f %8d %10.3f %8.2f' % (name, statistics.median(r['first_ms'] for r in runs), runs[0]['first_statements'],
+                                                       statistics.median(r['warm_ms'] for r in runs), runs[0]['warm_statements']))
+
+    encode_benchmark(args.iterations)
+
+
+if __name__ == '__main__':
+    main()
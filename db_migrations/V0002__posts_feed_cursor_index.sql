@@ -0,0 +1 @@
+CREATE INDEX idx_posts_created_id ON posts(created_at DESC, id DESC);
@@ -0,0 +1,6 @@
+ALTER TABLE posts ADD COLUMN likes_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE posts ADD COLUMN comments_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE posts p SET
+    likes_count = (SELECT COUNT(*) FROM likes l WHERE l.post_id = p.id AND l.created_at IS NOT NULL),
+    comments_count = (SELECT COUNT(*) FROM comments c WHERE c.post_id = p.id);
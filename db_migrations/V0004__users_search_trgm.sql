@@ -0,0 +1,6 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX idx_users_username_trgm ON users USING gin (username gin_trgm_ops);
+CREATE INDEX idx_users_display_name_trgm ON users USING gin (display_name gin_trgm_ops);
+CREATE INDEX idx_users_username_prefix ON users (lower(username) text_pattern_ops);
+CREATE INDEX idx_users_display_name_prefix ON users (lower(display_name) text_pattern_ops);
@@ -0,0 +1,13 @@
+CREATE TABLE home_timeline (
+    post_id TEXT PRIMARY KEY REFERENCES posts(id),
+    user_id TEXT NOT NULL REFERENCES users(id),
+    created_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX idx_home_timeline_created ON home_timeline(created_at DESC, post_id DESC);
+CREATE INDEX idx_home_timeline_user ON home_timeline(user_id);
+
+INSERT INTO home_timeline (post_id, user_id, created_at)
+SELECT p.id, p.user_id, COALESCE(p.created_at, NOW())
+FROM posts p JOIN users u ON u.id = p.user_id
+WHERE u.is_private = false;
@@ -0,0 +1,22 @@
+ALTER TABLE notifications ADD COLUMN actors_count INTEGER NOT NULL DEFAULT 1;
+
+-- Схлопываем уже накопившиеся непрочитанные лайки: одна запись на (получатель, пост)
+UPDATE notifications n SET actors_count = a.cnt
+FROM (
+    SELECT user_id, post_id, COUNT(DISTINCT from_user_id) AS cnt
+    FROM notifications
+    WHERE type = 'like' AND is_read = false
+    GROUP BY user_id, post_id
+) a
+WHERE n.type = 'like' AND n.is_read = false AND n.user_id = a.user_id AND n.post_id = a.post_id;
+
+DELETE FROM notifications n
+USING notifications m
+WHERE n.type = 'like' AND m.type = 'like'
+  AND n.is_read = false AND m.is_read = false
+  AND n.user_id = m.user_id AND n.post_id = m.post_id
+  AND (COALESCE(n.created_at, 'epoch'::timestamp), n.id) < (COALESCE(m.created_at, 'epoch'::timestamp), m.id);
+
+CREATE UNIQUE INDEX idx_notifications_like_unread ON notifications(user_id, post_id) WHERE type = 'like' AND is_read = false;
+CREATE INDEX idx_notifications_user_unread ON notifications(user_id, is_read, created_at DESC);
+CREATE INDEX idx_notifications_user_created ON notifications(user_id, created_at DESC, id DESC);
@@ -0,0 +1,7 @@
+ALTER TABLE comments ADD COLUMN replies_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE comments c SET replies_count = r.cnt
+FROM (SELECT parent_id, COUNT(*) AS cnt FROM comments WHERE parent_id IS NOT NULL GROUP BY parent_id) r
+WHERE c.id = r.parent_id;
+
+CREATE INDEX idx_comments_thread ON comments(post_id, parent_id, created_at, id);
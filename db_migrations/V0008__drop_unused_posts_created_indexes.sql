@@ -0,0 +1,3 @@
+-- Лента читается из home_timeline (V0005), профиль — по idx_posts_user: индексы по posts.created_at больше никому не нужны
+DROP INDEX IF EXISTS idx_posts_created_id;
+DROP INDEX IF EXISTS idx_posts_created;
@@ -0,0 +1,5 @@
+CREATE INDEX idx_users_username_trgm_gist ON users USING gist (username gist_trgm_ops);
+CREATE INDEX idx_users_display_name_trgm_gist ON users USING gist (display_name gist_trgm_ops);
+
+DROP INDEX IF EXISTS idx_users_username_trgm;
+DROP INDEX IF EXISTS idx_users_display_name_trgm;
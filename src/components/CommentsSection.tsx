@@ -14,8 +14,14 @@ interface Comment {
   display_name: string;
   avatar_url: string;
   is_verified: boolean;
+  reply_count: number;
+  replies: Comment[];
+  replies_cursor?: string | null;
 }
 
+const updateComment = (list: Comment[], id: string, fn: (c: Comment) => Comment): Comment[] =>
+  list.map((c) => (c.id === id ? fn(c) : { ...c, replies: updateComment(c.replies, id, fn) }));
+
 export default function CommentsSection({
   postId,
   onCountChange,
@@ -28,18 +34,46 @@ export default function CommentsSection({
   const [text, setText] = useState("");
   const [replyTo, setReplyTo] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   const load = async () => {
     try {
       const data = await api.getComments(postId);
       setComments(data.comments);
-      onCountChange?.(data.comments.length);
+      setNextCursor(data.next_cursor);
+      onCountChange?.(data.total);
     } catch (e) {
       console.error(e);
     }
     setLoading(false);
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const data = await api.getComments(postId, nextCursor);
+      setComments((prev) => [...prev, ...data.comments]);
+      setNextCursor(data.next_cursor);
+    } catch (e) {
+      console.error(e);
+    }
+  };
+
+  const loadReplies = async (c: Comment) => {
+    try {
+      const data = await api.getCommentThread(c.id, c.replies_cursor || undefined);
+      setComments((prev) =>
+        updateComment(prev, c.id, (x) => ({
+          ...x,
+          replies: [...x.replies, ...data.comments],
+          replies_cursor: data.next_cursor,
+        }))
+      );
+    } catch (e) {
+      console.error(e);
+    }
+  };
+
   useEffect(() => {
     load();
   }, [postId]);
@@ -56,9 +90,6 @@ export default function CommentsSection({
     }
   };
 
-  const topLevel = comments.filter((c) => !c.parent_id);
-  const replies = (id: string) => comments.filter((c) => c.parent_id === id);
-
   const renderComment = (c: Comment, depth = 0) => (
     <div key={c.id} className={`py-2 ${depth > 0 ? "ml-6 border-l border-border pl-3" : ""}`}>
       <div className="flex items-center gap-1.5 mb-1">
@@ -91,7 +122,15 @@ export default function CommentsSection({
           </button>
         </div>
       )}
-      {replies(c.id).map((r) => renderComment(r, depth + 1))}
+      {c.replies.map((r) => renderComment(r, depth + 1))}
+      {c.reply_count > c.replies.length && (c.replies.length === 0 || c.replies_cursor) && (
+        <button
+          onClick={() => loadReplies(c)}
+          className="text-[11px] text-primary hover:underline mt-1 ml-6"
+        >
+          Показать ответы ({c.reply_count - c.replies.length})
+        </button>
+      )}
     </div>
   );
 
@@ -101,7 +140,12 @@ export default function CommentsSection({
 
   return (
     <div>
-      {topLevel.map((c) => renderComment(c))}
+      {comments.map((c) => renderComment(c))}
+      {nextCursor && (
+        <button onClick={loadMore} className="text-xs text-primary hover:underline py-2">
+          Показать ещё комментарии
+        </button>
+      )}
       {comments.length === 0 && (
         <p className="text-muted-foreground text-sm py-2">Нет комментариев</p>
       )}
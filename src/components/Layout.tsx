@@ -1,11 +1,22 @@
+import { useState, useEffect } from "react";
 import { Link, useLocation, useNavigate } from "react-router-dom";
 import { useAuth } from "@/lib/auth";
+import api from "@/lib/api";
 import Icon from "@/components/ui/icon";
 
 export default function Layout({ children }: { children: React.ReactNode }) {
   const { user } = useAuth();
   const location = useLocation();
   const navigate = useNavigate();
+  const [unread, setUnread] = useState(0);
+
+  useEffect(() => {
+    if (!user) {
+      setUnread(0);
+      return;
+    }
+    api.getUnreadCount().then((data) => setUnread(data.count)).catch(() => setUnread(0));
+  }, [user, location.pathname]);
 
   const navItems = [
     { path: "/", icon: "Home", label: "Лента" },
@@ -75,6 +86,11 @@ export default function Layout({ children }: { children: React.ReactNode }) {
               } ${item.locked ? "opacity-50" : ""}`}
             >
               <Icon name={item.icon} size={20} />
+              {item.path === "/notifications" && unread > 0 && (
+                <span className="absolute -mt-1 ml-5 min-w-4 h-4 px-1 rounded-full bg-primary text-primary-foreground text-[10px] leading-4 text-center">
+                  {unread > 99 ? "99+" : unread}
+                </span>
+              )}
               <span className="text-[10px] font-medium">{item.label}</span>
               {item.locked && (
                 <Icon name="Lock" size={10} className="absolute -mt-1 ml-4 text-muted-foreground" />
@@ -37,25 +37,31 @@ export const api = {
   login: (email: string, password: string) =>
     request("/auth/login", "POST", { email, password }),
   me: () => request("/auth/me"),
-  getPosts: (page = 1) => request("/posts", "GET", undefined, { page: String(page) }),
+  getPosts: (cursor?: string) =>
+    request("/posts", "GET", undefined, cursor ? { cursor } : undefined),
   createPost: (content: string, image_url?: string) =>
     request("/posts", "POST", { content, image_url }),
   toggleLike: (post_id: string) => request("/likes", "POST", { post_id }),
-  getComments: (post_id: string) =>
-    request("/comments", "GET", undefined, { post_id }),
+  getComments: (post_id: string, cursor?: string) =>
+    request("/comments", "GET", undefined, cursor ? { post_id, cursor } : { post_id }),
+  getCommentThread: (comment_id: string, cursor?: string) =>
+    request("/comments/thread", "GET", undefined, cursor ? { comment_id, cursor } : { comment_id }),
   addComment: (post_id: string, content: string, parent_id?: string) =>
     request("/comments", "POST", { post_id, content, parent_id }),
   getProfile: (username: string) =>
     request("/profile", "GET", undefined, { username }),
   updateProfile: (data: { display_name?: string; bio?: string; is_private?: boolean; avatar_url?: string }) =>
     request("/profile/update", "POST", data),
-  searchUsers: (q: string) => request("/search", "GET", undefined, { q }),
+  searchUsers: (q: string, cursor?: string) =>
+    request("/search", "GET", undefined, cursor ? { q, cursor } : { q }),
   requestVerification: (reason: string) =>
     request("/verification/request", "POST", { reason }),
   getVerificationRequests: () => request("/verification/list"),
   reviewVerification: (request_id: string, action: "approve" | "reject") =>
     request("/verification/review", "POST", { request_id, action }),
-  getNotifications: () => request("/notifications"),
+  getNotifications: (cursor?: string) =>
+    request("/notifications", "GET", undefined, cursor ? { cursor } : undefined),
+  getUnreadCount: () => request("/notifications/unread_count"),
   markNotificationsRead: () => request("/notifications/read", "POST"),
   uploadAvatar: (image: string) => request("/upload/avatar", "POST", { image }),
   uploadImage: (image: string) => request("/upload/image", "POST", { image }),
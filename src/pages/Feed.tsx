@@ -8,16 +8,17 @@ export default function Feed() {
   const { user } = useAuth();
   const [posts, setPosts] = useState<Post[]>([]);
   const [loading, setLoading] = useState(true);
-  const [page, setPage] = useState(1);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  const load = async (p = 1) => {
+  const load = async (cursor?: string) => {
     try {
-      const data = await api.getPosts(p);
-      if (p === 1) {
+      const data = await api.getPosts(cursor);
+      if (!cursor) {
         setPosts(data.posts);
       } else {
         setPosts((prev) => [...prev, ...data.posts]);
       }
+      setNextCursor(data.next_cursor);
     } catch (e) {
       console.error(e);
     }
@@ -29,9 +30,7 @@ export default function Feed() {
   }, []);
 
   const loadMore = () => {
-    const next = page + 1;
-    setPage(next);
-    load(next);
+    if (nextCursor) load(nextCursor);
   };
 
   if (loading) {
@@ -44,7 +43,7 @@ export default function Feed() {
 
   return (
     <div>
-      {user && <CreatePost onCreated={() => load(1)} />}
+      {user && <CreatePost onCreated={() => load()} />}
       {!user && (
         <div className="p-4 border-b border-border bg-primary/5">
           <p className="text-sm text-muted-foreground text-center">
@@ -59,9 +58,9 @@ export default function Feed() {
         </div>
       )}
       {posts.map((post) => (
-        <PostCard key={post.id} post={post} onUpdate={() => load(1)} />
+        <PostCard key={post.id} post={post} onUpdate={() => load()} />
       ))}
-      {posts.length >= 20 && (
+      {nextCursor && (
         <button
           onClick={loadMore}
           className="w-full py-3 text-sm text-primary hover:bg-primary/5 transition-colors"
@@ -14,17 +14,20 @@ interface Notification {
   from_display_name: string;
   from_avatar_url: string;
   from_is_verified: boolean;
+  actors_count: number;
 }
 
 export default function Notifications() {
   const [notifs, setNotifs] = useState<Notification[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   useEffect(() => {
     const load = async () => {
       try {
         const data = await api.getNotifications();
         setNotifs(data.notifications);
+        setNextCursor(data.next_cursor);
         await api.markNotificationsRead();
       } catch (e) {
         console.error(e);
@@ -34,6 +37,17 @@ export default function Notifications() {
     load();
   }, []);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const data = await api.getNotifications(nextCursor);
+      setNotifs((prev) => [...prev, ...data.notifications]);
+      setNextCursor(data.next_cursor);
+    } catch (e) {
+      console.error(e);
+    }
+  };
+
   const iconForType = (type: string) => {
     switch (type) {
       case "like": return "Heart";
@@ -87,6 +101,9 @@ export default function Notifications() {
                 </Link>
               )}
               {n.from_is_verified && <Icon name="BadgeCheck" size={12} className="text-primary" />}
+              {n.actors_count > 1 && (
+                <span className="text-sm text-muted-foreground">и ещё {n.actors_count - 1}</span>
+              )}
             </div>
             <p className="text-sm text-muted-foreground">{n.message}</p>
             <p className="text-[10px] text-muted-foreground mt-1">
@@ -95,6 +112,14 @@ export default function Notifications() {
           </div>
         </div>
       ))}
+      {nextCursor && (
+        <button
+          onClick={loadMore}
+          className="w-full py-3 text-sm text-primary hover:bg-primary/5 transition-colors"
+        >
+          Загрузить ещё
+        </button>
+      )}
     </div>
   );
 }
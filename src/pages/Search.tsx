@@ -16,6 +16,7 @@ export default function Search() {
   const [query, setQuery] = useState("");
   const [results, setResults] = useState<UserResult[]>([]);
   const [searched, setSearched] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [showVerifyBot, setShowVerifyBot] = useState(false);
   const [verifyReason, setVerifyReason] = useState("");
   const [verifyStatus, setVerifyStatus] = useState<"idle" | "loading" | "success" | "error">("idle");
@@ -26,12 +27,24 @@ export default function Search() {
     try {
       const data = await api.searchUsers(query.trim());
       setResults(data.users);
+      setNextCursor(data.next_cursor);
       setSearched(true);
     } catch (e) {
       console.error(e);
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const data = await api.searchUsers(query.trim(), nextCursor);
+      setResults((prev) => [...prev, ...data.users]);
+      setNextCursor(data.next_cursor);
+    } catch (e) {
+      console.error(e);
+    }
+  };
+
   const submitVerification = async () => {
     if (!verifyReason.trim()) return;
     setVerifyStatus("loading");
@@ -145,6 +158,14 @@ export default function Search() {
             </div>
           </Link>
         ))}
+        {nextCursor && (
+          <button
+            onClick={loadMore}
+            className="w-full py-3 text-sm text-primary hover:bg-primary/5 transition-colors"
+          >
+            Загрузить ещё
+          </button>
+        )}
       </div>
     </div>
   );